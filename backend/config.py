@@ -1,3 +1,6 @@
+from datetime import date, time
+from typing import List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,6 +8,52 @@ class Config(BaseSettings):
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_db: int = 0
+    redis_max_connections: int = 20
+    redis_timeout: float = 0.5
+    cache_ttl: int = 3600
+    cache_immutable_ttl: int = 30 * 24 * 3600
+    memory_cache_max_entries: int = 1024
+    memory_cache_ttl: float = 60.0
+    memory_cache_stale_ttl: float = 300.0
+    cache_lock_timeout: float = 10.0
+    database_path: str = "database.db"
+    database_read_workers: int = 4
+    database_batch_size: int = 1000
+    # Past years of rates, compacted from the database at startup
+    archive_enabled: bool = True
+    archive_path: str = "rates.archive"
+    cbr_base_url: str = "http://www.cbr.ru/scripts"
+    http_timeout: float = 10.0
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    cbr_requests_per_second: float = 5.0
+    cbr_daily_timeout: float = 5.0
+    cbr_dynamic_timeout: float = 15.0
+    # A request still unanswered after this long is duplicated; 0 disables it
+    cbr_hedge_delay: float = 2.0
+    # Consecutive failures that open the circuit, and how long it stays open
+    cbr_breaker_threshold: int = 5
+    cbr_breaker_reset_timeout: float = 5.0
+    cbr_breaker_max_reset_timeout: float = 300.0
+    # Moscow time
+    cbr_publication_time: time = time(15, 30)
+    # Days off and working weekend days moved by the yearly decree
+    cbr_holidays: List[date] = []
+    cbr_working_days: List[date] = []
+    scheduler_enabled: bool = True
+    scheduler_poll_interval: float = 300.0
+    # Polling starts this long before a publication is expected
+    scheduler_poll_lead: float = 1800.0
+    scheduler_lease_ttl: float = 60.0
+    warm_bases: List[str] = ["USD", "EUR", "RUB"]
+    # Days of history preloaded by a background job at startup; 0 disables it
+    preload_days: int = 180
+    preload_concurrency: int = 4
+    preload_max_retries: int = 5
+    preload_backoff_base: float = 1.0
+    preload_backoff_max: float = 60.0
+    jobs_poll_interval: float = 2.0
+    jobs_lease_ttl: float = 30.0
 
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
@@ -1,67 +1,67 @@
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 from litestar import Litestar
 from litestar.config.cors import CORSConfig
 from routes import currency
+from routes.currency import COMPLETE_HEADER
 from routes import healthcheck
-from repositories.rates_repository import RatesRepository
-from services.exchanges import ExchangesService
+from routes import jobs as jobs_routes
+from repositories.jobs_repository import JobsRepository
+from services.exchanges import ARCHIVE_JOB, PRELOAD_JOB, ExchangesService
+from services.jobs import JobManager
+from services.scheduler import RateScheduler
 from config import get_config
 from loguru import logger
 import asyncio
-import threading
 
 
-def init_db() -> None:
+@asynccontextmanager
+async def exchanges_service_lifespan(app: Litestar) -> AsyncGenerator[None, None]:
     """
-    Initialize database tables.
+    Create the process-wide exchanges service and background jobs, and release
+    their pools on shutdown.
     """
-    repo = RatesRepository()
+    config = get_config()
+    exchanges_service = ExchangesService(config=config)
+    app.state.exchanges_service = exchanges_service
     logger.info("Database initialized successfully")
-
-
-async def preload_data() -> None:
-    """
-    Preload historical data in background.
-    """
-
-    logger.info("Starting background historical data preload...")
-
+    jobs = JobManager.from_config(JobsRepository(exchanges_service.repository), config)
+    jobs.register(PRELOAD_JOB, exchanges_service.preload_job)
+    jobs.register(ARCHIVE_JOB, exchanges_service.archive_job)
+    app.state.jobs = jobs
+    tasks = [
+        asyncio.create_task(exchanges_service.listen_for_updates()),
+        asyncio.create_task(jobs.run()),
+    ]
+    if config.scheduler_enabled:
+        scheduler = RateScheduler.from_config(exchanges_service, config)
+        tasks.append(asyncio.create_task(scheduler.run()))
+    if config.preload_days > 0:
+        # Workers starting together all get the same job, run by one of them.
+        job = await jobs.submit(PRELOAD_JOB, {"days": config.preload_days})
+        logger.info(f"Historical data preload is job {job.id}")
+    if config.archive_enabled:
+        await jobs.submit(ARCHIVE_JOB, {})
     try:
-        config = get_config()
-        exchange_service = ExchangesService(config=config)
-
-        await exchange_service.preload_historical_data(days=180)
-        logger.info("Background data preload completed successfully!")
-
-    except Exception as e:
-        logger.error(f"Background data preload failed: {e}")
-
-
-def start_background_preload() -> None:
-    """
-    Start background preload task.
-    """
-
-    def run_preload() -> None:
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(preload_data())
-        except Exception as e:
-            logger.error(f"Background preload thread failed: {e}")
-        finally:
-            loop.close()
-
-    thread = threading.Thread(target=run_preload, daemon=True)
-    thread.start()
-    logger.info("Background preload thread started")
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await exchanges_service.close()
 
 
 app = Litestar(
-    route_handlers=[currency.exchanges_router, healthcheck.health_check_router],
+    route_handlers=[
+        currency.exchanges_router,
+        jobs_routes.jobs_router,
+        healthcheck.health_check_router,
+    ],
     cors_config=CORSConfig(
         allow_origins=["http://localhost:3000"],
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[COMPLETE_HEADER],
     ),
-    on_startup=[init_db, start_background_preload],
+    lifespan=[exchanges_service_lifespan],
 )
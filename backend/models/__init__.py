@@ -1,4 +1,19 @@
+from .currency import Currency
 from .currency import ExchangeRates
+from .currency import HistoricalBatch
 from .currency import HistoricalRate
+from .currency import HistoricalSeries
+from .currency import RateCandle
+from .currency import RateSnapshot
+from .job import Job
 
-__all__ = ["ExchangeRates", "HistoricalRate"]
+__all__ = [
+    "Currency",
+    "ExchangeRates",
+    "HistoricalBatch",
+    "HistoricalRate",
+    "HistoricalSeries",
+    "Job",
+    "RateCandle",
+    "RateSnapshot",
+]
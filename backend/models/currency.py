@@ -1,5 +1,15 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, List, Optional
+
+
+@dataclass
+class Currency:
+    code: str
+    name: str
+    # Units of the currency the CBR quotes a rate for
+    nominal: int
+    # Id used by the CBR series API; None for the rouble
+    cbr_id: Optional[str] = None
 
 
 @dataclass
@@ -13,3 +23,39 @@ class ExchangeRates:
 class HistoricalRate:
     date: str
     rate: float
+
+
+@dataclass
+class RateCandle:
+    date: str
+    open: float
+    high: float
+    low: float
+    close: float
+
+
+@dataclass
+class HistoricalSeries:
+    currency: str
+    base: str
+    start: str
+    end: str
+    resolution: str
+    rates: List[HistoricalRate]
+    candles: Optional[List[RateCandle]] = None
+
+
+@dataclass
+class HistoricalBatch:
+    start: str
+    end: str
+    dates: List[str]
+    # "CUR/BASE" -> rates aligned with `dates`, null where unknown
+    series: Dict[str, List[Optional[float]]]
+
+
+@dataclass
+class RateSnapshot:
+    date: str
+    document_date: str
+    rates: Dict[str, float]
@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class Job:
+    """
+    A background job as stored in the `jobs` table; times are ISO 8601 UTC.
+    """
+
+    id: str
+    kind: str
+    params: Dict[str, Any]
+    # pending, running, completed, failed or cancelled
+    state: str
+    created_at: str
+    done: int = 0
+    total: int = 0
+    stage: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    # When the job is expected to finish at its current pace
+    eta: Optional[str] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    # Where a resumed job picks up
+    checkpoint: Optional[Dict[str, Any]] = None
@@ -1,3 +1,5 @@
+from .jobs_repository import JobsRepository
+from .rate_archive import ArchiveSegment, RateArchive
 from .rates_repository import RatesRepository
 
-__all__ = ["RatesRepository"]
+__all__ = ["ArchiveSegment", "JobsRepository", "RateArchive", "RatesRepository"]
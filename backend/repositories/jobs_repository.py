@@ -0,0 +1,317 @@
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from models.job import Job
+from repositories.rates_repository import RatesRepository
+
+JOB_COLUMNS = """
+    id, kind, params, state, created_at, done, total, stage, started_at,
+    finished_at, eta, error, cancel_requested, checkpoint
+"""
+
+# Pending jobs, and running ones whose worker stopped renewing the lease,
+# unless a live worker already runs another job of the same kind.
+CLAIMABLE_SQL = """
+    SELECT id FROM jobs AS j
+    WHERE kind IN ({kinds})
+        AND (state = 'pending' OR (state = 'running' AND lease_until < ?))
+        AND NOT EXISTS (
+            SELECT 1 FROM jobs AS other
+            WHERE other.kind = j.kind
+                AND other.id != j.id
+                AND other.state = 'running'
+                AND other.lease_until >= ?
+        )
+    ORDER BY created_at
+    LIMIT 1
+"""
+
+
+class JobProgress(NamedTuple):
+    stage: Optional[str]
+    done: int
+    total: int
+    checkpoint: Dict[str, Any]
+    # Unix time
+    eta: Optional[float] = None
+
+
+class JobsRepository:
+    """
+    Background jobs, kept in the rates database that every worker on the host
+    shares. Queries run on the threads of the rates repository, so job
+    updates queue behind the same single writer as the rates.
+    """
+
+    def __init__(self, database: RatesRepository) -> None:
+        self.database = database
+
+    async def create_job(self, job_id: str, kind: str, params: Dict[str, Any]) -> Job:
+        """
+        Add a pending job unless one of the same kind and parameters is
+        already pending or running, in which case that one is returned.
+        """
+        encoded = json.dumps(params, sort_keys=True)
+
+        def query(conn: sqlite3.Connection) -> Job:
+            conn.execute(
+                """
+                INSERT INTO jobs (id, kind, params, state, created_at)
+                SELECT ?, ?, ?, 'pending', ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM jobs
+                    WHERE kind = ? AND params = ? AND state IN ('pending', 'running')
+                )
+                """,
+                (job_id, kind, encoded, time.time(), kind, encoded),
+            )
+            row = conn.execute(
+                f"""
+                SELECT {JOB_COLUMNS} FROM jobs
+                WHERE kind = ? AND params = ?
+                ORDER BY state IN ('pending', 'running') DESC, created_at DESC
+                LIMIT 1
+                """,
+                (kind, encoded),
+            ).fetchone()
+            return _to_job(row)
+
+        return await self.database.run_write(query)
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        def query(conn: sqlite3.Connection) -> Optional[Job]:
+            row = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            return _to_job(row) if row else None
+
+        return await self.database.run_read(query)
+
+    async def list_jobs(self, limit: int = 20) -> List[Job]:
+        def query(conn: sqlite3.Connection) -> List[Job]:
+            rows = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+            return [_to_job(row) for row in rows]
+
+        return await self.database.run_read(query)
+
+    async def claim_job(
+        self, owner: str, kinds: Sequence[str], lease_ttl: float
+    ) -> Optional[Job]:
+        """
+        Take the oldest runnable job of the given kinds for `owner`.
+        The candidate is looked up first so idle polls never take the write lock.
+        """
+        if not kinds:
+            return None
+        sql = CLAIMABLE_SQL.format(kinds=", ".join("?" * len(kinds)))
+
+        def query(conn: sqlite3.Connection) -> Optional[Job]:
+            now = time.time()
+            params = (*kinds, now, now)
+            if conn.execute(sql, params).fetchone() is None:
+                return None
+            # Looked up again inside the update, which runs under the write
+            # lock, so two workers can never both claim a job of one kind.
+            row = conn.execute(
+                f"""
+                UPDATE jobs
+                SET state = 'running', owner = ?, lease_until = ?,
+                    started_at = ?, eta = NULL
+                WHERE id = ({sql})
+                RETURNING {JOB_COLUMNS}
+                """,
+                (owner, now + lease_ttl, now, *params),
+            ).fetchone()
+            return _to_job(row) if row else None
+
+        return await self.database.run_write(query)
+
+    async def save_progress(
+        self, job_id: str, owner: str, progress: JobProgress, lease_ttl: float
+    ) -> bool:
+        """
+        Record progress and renew the lease; False if `owner` no longer holds it.
+        """
+
+        def query(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                """
+                UPDATE jobs
+                SET stage = ?, done = ?, total = ?, checkpoint = ?, eta = ?,
+                    lease_until = ?
+                WHERE id = ? AND owner = ? AND state = 'running'
+                """,
+                (*_progress_values(progress), time.time() + lease_ttl, job_id, owner),
+            )
+            return cursor.rowcount > 0
+
+        return await self.database.run_write(query)
+
+    async def get_cancel_requests(self, owner: str) -> List[str]:
+        """
+        Ids of jobs run by `owner` that somebody asked to cancel.
+        """
+
+        def query(conn: sqlite3.Connection) -> List[str]:
+            rows = conn.execute(
+                """
+                SELECT id FROM jobs
+                WHERE owner = ? AND state = 'running' AND cancel_requested = 1
+                """,
+                (owner,),
+            ).fetchall()
+            return [row[0] for row in rows]
+
+        return await self.database.run_read(query)
+
+    async def release_job(self, job_id: str, owner: str, progress: JobProgress) -> None:
+        """
+        Put a running job back to pending, to be resumed from its checkpoint.
+        """
+
+        def query(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                """
+                UPDATE jobs
+                SET stage = ?, done = ?, total = ?, checkpoint = ?, eta = ?,
+                    state = 'pending', owner = NULL, lease_until = NULL
+                WHERE id = ? AND owner = ? AND state = 'running'
+                """,
+                (*_progress_values(progress._replace(eta=None)), job_id, owner),
+            )
+
+        await self.database.run_write(query)
+
+    async def finish_job(
+        self,
+        job_id: str,
+        owner: str,
+        state: str,
+        progress: JobProgress,
+        error: Optional[str] = None,
+    ) -> None:
+        def query(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                """
+                UPDATE jobs
+                SET stage = ?, done = ?, total = ?, checkpoint = ?, eta = ?,
+                    state = ?, error = ?, finished_at = ?,
+                    owner = NULL, lease_until = NULL
+                WHERE id = ? AND owner = ? AND state = 'running'
+                """,
+                (
+                    *_progress_values(progress._replace(eta=None)),
+                    state,
+                    error,
+                    time.time(),
+                    job_id,
+                    owner,
+                ),
+            )
+
+        await self.database.run_write(query)
+
+    async def request_cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Flag a job for cancellation. A job no worker is running is cancelled
+        on the spot; a running one is stopped by its worker.
+        """
+
+        def query(conn: sqlite3.Connection) -> Optional[Job]:
+            now = time.time()
+            conn.execute(
+                """
+                UPDATE jobs
+                SET cancel_requested = 1,
+                    state = CASE WHEN state = 'pending' OR lease_until < :now
+                        THEN 'cancelled' ELSE state END,
+                    finished_at = CASE WHEN state = 'pending' OR lease_until < :now
+                        THEN :now ELSE finished_at END,
+                    eta = CASE WHEN state = 'pending' OR lease_until < :now
+                        THEN NULL ELSE eta END
+                WHERE id = :id AND state IN ('pending', 'running')
+                """,
+                {"id": job_id, "now": now},
+            )
+            row = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            return _to_job(row) if row else None
+
+        return await self.database.run_write(query)
+
+    async def delete_finished_jobs(self, before: float) -> int:
+        """
+        Remove jobs that finished before the given Unix time.
+        """
+
+        def query(conn: sqlite3.Connection) -> int:
+            cursor = conn.execute(
+                """
+                DELETE FROM jobs
+                WHERE state IN ('completed', 'failed', 'cancelled') AND finished_at < ?
+                """,
+                (before,),
+            )
+            return cursor.rowcount
+
+        return await self.database.run_write(query)
+
+
+def _progress_values(
+    progress: JobProgress,
+) -> Tuple[Optional[str], int, int, str, Optional[float]]:
+    return (
+        progress.stage,
+        progress.done,
+        progress.total,
+        json.dumps(progress.checkpoint),
+        progress.eta,
+    )
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def _to_job(row: Tuple[Any, ...]) -> Job:
+    (
+        job_id,
+        kind,
+        params,
+        state,
+        created_at,
+        done,
+        total,
+        stage,
+        started_at,
+        finished_at,
+        eta,
+        error,
+        cancel_requested,
+        checkpoint,
+    ) = row
+    return Job(
+        id=job_id,
+        kind=kind,
+        params=json.loads(params),
+        state=state,
+        created_at=_iso(created_at) or "",
+        done=done,
+        total=total,
+        stage=stage,
+        started_at=_iso(started_at),
+        finished_at=_iso(finished_at),
+        eta=_iso(eta),
+        error=error,
+        cancel_requested=bool(cancel_requested),
+        checkpoint=json.loads(checkpoint) if checkpoint else None,
+    )
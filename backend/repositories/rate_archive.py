@@ -0,0 +1,177 @@
+import mmap
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+from numpy.typing import NDArray
+
+from repositories.schema import from_day, to_day
+
+# File header: magic and format version.
+FILE_MAGIC = b"RUBRATES"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<8sII")
+# Segment header: marker, first day (days since 1970-01-01), number of days,
+# number of currencies. It is followed by the currency codes, 8 bytes each,
+# then one float64 column per currency. Every part is a multiple of 8 bytes,
+# so the columns stay aligned for zero-copy views.
+SEGMENT_MARKER = b"YEAR"
+SEGMENT_HEADER = struct.Struct("<4siII")
+CODE_SIZE = 8
+
+
+@dataclass(frozen=True)
+class ArchiveSegment:
+    """
+    The RUB rates of one calendar year, as a currencies x days block that
+    views the memory-mapped file.
+    """
+
+    start_date: date
+    currencies: Tuple[str, ...]
+    values: NDArray[np.float64]
+
+    @property
+    def end_date(self) -> date:
+        return self.start_date + timedelta(days=self.values.shape[1] - 1)
+
+    def column(
+        self, currency: str, start_date: date, end_date: date
+    ) -> Optional[NDArray[np.float64]]:
+        """
+        A read-only view of the rates of a currency between two dates of the
+        year, or None if the currency is not archived.
+        """
+        try:
+            row = self.currencies.index(currency)
+        except ValueError:
+            return None
+        first = (start_date - self.start_date).days
+        return self.values[row, first : first + (end_date - start_date).days + 1]
+
+
+class RateArchive:
+    """
+    Binary archive of past years of RUB rates, compacted from the `rates`
+    table and memory-mapped for reads. Each year is a segment holding only the
+    currencies whose rates were complete when it was written. Writing a year
+    replaces the whole file, so a rewritten year takes no extra space; other
+    workers see the new file on their next read.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+        # Inode, size and modification time of the mapped file
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._segments: Dict[int, ArchiveSegment] = {}
+
+    def segment(self, year: int) -> Optional[ArchiveSegment]:
+        self._refresh()
+        return self._segments.get(year)
+
+    def write(
+        self, year: int, currencies: Sequence[str], values: NDArray[np.float64]
+    ) -> None:
+        """
+        Store the days x currencies rates of a year, replacing its segment.
+        The file is rewritten next to the old one and renamed over it.
+        """
+        start_date = date(year, 1, 1)
+        days = (date(year, 12, 31) - start_date).days + 1
+        if values.shape != (days, len(currencies)):
+            raise ValueError(f"Expected {days} x {len(currencies)} rates for {year}")
+
+        with self._lock:
+            self._refresh_locked()
+            if self._stat and self._stat[1] >= FILE_HEADER.size and not self._mmap:
+                raise ValueError(f"{self.path} is not a rate archive")
+            segments = dict(self._segments)
+            segments[year] = ArchiveSegment(
+                start_date, tuple(currencies), np.ascontiguousarray(values.T)
+            )
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, 0))
+                for _, segment in sorted(segments.items()):
+                    file.write(_pack_segment(segment))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+            self._refresh_locked()
+
+    def _refresh(self) -> None:
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self) -> None:
+        try:
+            info = os.stat(self.path)
+            stat: Optional[Tuple[int, int, int]] = (
+                info.st_ino,
+                info.st_size,
+                info.st_mtime_ns,
+            )
+        except FileNotFoundError:
+            stat = None
+        if stat == self._stat:
+            return
+        self._stat = stat
+        self._mmap = None
+        self._segments = {}
+        size = stat[1] if stat else 0
+        if size < FILE_HEADER.size:
+            return
+
+        with open(self.path, "rb") as file:
+            # Views of an older mapping keep it alive until they are dropped.
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = FILE_HEADER.unpack_from(buffer, 0)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            logger.error(f"{self.path} is not a version {FILE_VERSION} rate archive")
+            return
+        self._mmap = buffer
+        offset = FILE_HEADER.size
+        while offset + SEGMENT_HEADER.size <= size:
+            marker, first_day, days, count = SEGMENT_HEADER.unpack_from(buffer, offset)
+            if marker != SEGMENT_MARKER:
+                logger.error(f"Corrupt rate archive segment at {offset} in {self.path}")
+                break
+            codes_at = offset + SEGMENT_HEADER.size
+            values_at = codes_at + count * CODE_SIZE
+            end = values_at + count * days * 8
+            if end > size:
+                logger.error(
+                    f"Truncated rate archive segment at {offset} in {self.path}"
+                )
+                break
+            currencies = tuple(
+                buffer[at : at + CODE_SIZE].rstrip(b"\0").decode("ascii")
+                for at in range(codes_at, values_at, CODE_SIZE)
+            )
+            values = np.frombuffer(
+                buffer, dtype="<f8", count=count * days, offset=values_at
+            ).reshape(count, days)
+            start_date = from_day(first_day)
+            self._segments[start_date.year] = ArchiveSegment(
+                start_date, currencies, values
+            )
+            offset = end
+
+
+def _pack_segment(segment: ArchiveSegment) -> bytes:
+    currencies, values = segment.currencies, segment.values
+    header = SEGMENT_HEADER.pack(
+        SEGMENT_MARKER, to_day(segment.start_date), values.shape[1], len(currencies)
+    )
+    codes = b"".join(
+        code.upper().encode("ascii").ljust(CODE_SIZE, b"\0")[:CODE_SIZE]
+        for code in currencies
+    )
+    return header + codes + np.ascontiguousarray(values, dtype="<f8").tobytes()
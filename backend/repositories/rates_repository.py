@@ -1,180 +1,444 @@
+import asyncio
 import sqlite3
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 from datetime import date, timedelta
-from models.currency import HistoricalRate
+from models.currency import Currency, RateSnapshot
+from repositories.schema import from_day, init_schema, to_day
+
+T = TypeVar("T")
+
+# (currency, ISO date, rate to RUB)
+RateRow = Tuple[str, str, float]
+
+UPSERT_RATE_SQL = """
+    INSERT INTO rates (currency_id, day, rate)
+    VALUES ((SELECT id FROM currencies WHERE code = ?), ?, ?)
+    ON CONFLICT(currency_id, day)
+    DO UPDATE SET rate = excluded.rate WHERE rate != excluded.rate
+"""
+
+# Calendar days of the range anti-joined against the stored rates of every
+# requested currency and against the days the CBR has no rate for.
+# Consecutive missing days share `day - ROW_NUMBER()`, which collapses them
+# into (code, first day, last day) intervals.
+MISSING_INTERVALS_SQL = """
+    WITH RECURSIVE
+        days(day) AS (
+            SELECT ? UNION ALL SELECT day + 1 FROM days WHERE day < ?
+        ),
+        codes(code) AS (VALUES {codes}),
+        missing(code, day) AS (
+            SELECT codes.code, days.day
+            FROM codes
+            LEFT JOIN currencies c ON c.code = codes.code
+            CROSS JOIN days
+            WHERE NOT EXISTS (
+                SELECT 1 FROM rates r
+                WHERE r.currency_id = c.id AND r.day = days.day
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM unavailable u
+                WHERE u.currency_id = c.id AND u.day = days.day
+            )
+        )
+    SELECT code, MIN(day), MAX(day)
+    FROM (
+        SELECT code, day,
+            day - ROW_NUMBER() OVER (PARTITION BY code ORDER BY day) AS island
+        FROM missing
+    )
+    GROUP BY code, island
+    ORDER BY code, MIN(day)
+"""
 
 
 class RatesRepository:
-    def __init__(self, db_path: str = "database.db") -> None:
+    def __init__(
+        self,
+        db_path: str = "database.db",
+        read_workers: int = 4,
+        batch_size: int = 1000,
+    ) -> None:
         self.db_path: str = db_path
+        self.batch_size = batch_size
+        # All writes go through a single thread so they never contend with each
+        # other; reads run on their own pool and, thanks to WAL, are not blocked
+        # by a write in progress.
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-writer"
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=read_workers, thread_name_prefix="sqlite-reader"
+        )
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns the long-lived connection of the current thread.
+        """
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-16000")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    async def run_read(self, query: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run `query` on a connection of the reader pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, lambda: query(self._connect()))
+
+    async def run_write(self, query: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run `query` in a transaction on the single writer thread.
+        """
+
+        def run() -> T:
+            conn = self._connect()
+            with conn:
+                return query(conn)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, run)
+
+    def close(self) -> None:
+        """
+        Stops the database threads and closes their connections. Blocks until
+        queries in flight finish, so async code runs it in a thread.
+        """
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
     def _init_db(self) -> None:
         """
-        Initialize the database and create the `historical_rates` table if it doesn't exist.
+        Initialize the database, migrating the legacy `historical_rates` layout if present.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS historical_rates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    currency TEXT NOT NULL,
-                    base_currency TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    rate REAL NOT NULL,
-                    UNIQUE(currency, base_currency, date)
-                )
+        conn = sqlite3.connect(self.db_path)
+        try:
+            init_schema(conn)
+        finally:
+            conn.close()
+
+    async def save_snapshot(
+        self, snapshot: RateSnapshot, days: Optional[Iterable[date]] = None
+    ) -> None:
+        """
+        Saves all RUB-based rates of a CBR daily document in a single transaction,
+        for every day of `days` it is in effect on, or only for its own date.
+        """
+        days = list(days) if days is not None else [date.fromisoformat(snapshot.date)]
+        rows = [
+            (currency.upper(), day.isoformat(), rate)
+            for day in days
+            for currency, rate in snapshot.rates.items()
+            if currency.upper() != "RUB"
+        ]
+
+        def query(conn: sqlite3.Connection) -> None:
+            self._upsert_rows(conn, rows, self.batch_size)
+            conn.executemany(
                 """
+                INSERT OR REPLACE INTO snapshots (day, document_date)
+                VALUES (?, ?)
+                """,
+                [(to_day(day), snapshot.document_date) for day in days],
             )
-            conn.commit()
 
-    def save_rates(
-        self, currency: str, base_currency: str, rates: List[HistoricalRate]
-    ) -> None:
+        await self.run_write(query)
+
+    async def copy_rates(
+        self, currencies: Iterable[str], sources: Dict[date, date]
+    ) -> int:
+        """
+        Copies the stored RUB rates of the currencies from each source day to
+        the target day it maps from, where the target has none yet.
+        Returns the number of copied rows.
         """
-        Saves a list of exchange rates for a given currency pair into the database.
+        codes = sorted({code.upper() for code in currencies} - {"RUB"})
+        pairs = [(to_day(target), to_day(source)) for target, source in sources.items()]
+        if not codes or not pairs:
+            return 0
+        sql = f"""
+            INSERT OR IGNORE INTO rates (currency_id, day, rate)
+            SELECT r.currency_id, ?, r.rate FROM rates r
+            JOIN currencies c ON c.id = r.currency_id
+            WHERE r.day = ? AND c.code IN ({", ".join("?" * len(codes))})
         """
-        with sqlite3.connect(self.db_path) as conn:
-            for rate in rates:
-                conn.execute(
-                    """
-                    INSERT OR REPLACE INTO historical_rates (currency, base_currency, date, rate)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (currency.upper(), base_currency.upper(), rate.date, rate.rate),
-                )
-            conn.commit()
 
-    def get_rate_by_date(
-        self, currency: str, base_currency: str, target_date: date
-    ) -> Optional[HistoricalRate]:
+        def query(conn: sqlite3.Connection) -> int:
+            changes_before = conn.total_changes
+            conn.executemany(sql, [(*pair, *codes) for pair in pairs])
+            return conn.total_changes - changes_before
+
+        return await self.run_write(query)
+
+    async def get_latest_snapshot_date(self, before: date) -> Optional[date]:
         """
-        Gets the exchange rate for a given currency pair on a specific date.
+        Gets the latest date before `before` that has a stored snapshot.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                """
-                    SELECT date, rate FROM historical_rates
-                    WHERE currency = ? AND base_currency = ? AND date = ?
-                    """,
-                (currency.upper(), base_currency.upper(), target_date.isoformat()),
-            )
-            row = cursor.fetchone()
-            if row:
-                return HistoricalRate(date=row[0], rate=row[1])
-            return None
 
-    def save_single_rate(
-        self, currency: str, base_currency: str, rate: HistoricalRate
-    ) -> None:
+        def query(conn: sqlite3.Connection) -> Optional[date]:
+            row = conn.execute(
+                "SELECT MAX(day) FROM snapshots WHERE day < ?", (to_day(before),)
+            ).fetchone()
+            return from_day(row[0]) if row[0] is not None else None
+
+        return await self.run_read(query)
+
+    async def get_snapshot(self, target_date: date) -> Optional[RateSnapshot]:
         """
-        Saves a single exchange rate into the database.
+        Gets the stored RUB-based rate table for a specific date.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
+
+        def query(conn: sqlite3.Connection) -> Optional[RateSnapshot]:
+            row = conn.execute(
+                "SELECT document_date FROM snapshots WHERE day = ?",
+                (to_day(target_date),),
+            ).fetchone()
+            if row is None:
+                return None
+
+            cursor = conn.execute(
                 """
-                INSERT OR REPLACE INTO historical_rates (currency, base_currency, date, rate)
-                VALUES (?, ?, ?, ?)
+                SELECT c.code, r.rate FROM rates r
+                JOIN currencies c ON c.id = r.currency_id
+                WHERE r.day = ?
                 """,
-                (currency.upper(), base_currency.upper(), rate.date, rate.rate),
+                (to_day(target_date),),
+            )
+            rates: Dict[str, float] = {code: rate for code, rate in cursor.fetchall()}
+            rates["RUB"] = 1.0
+            return RateSnapshot(
+                date=target_date.isoformat(), document_date=row[0], rates=rates
             )
-            conn.commit()
 
-    def get_rates(
-        self, currency: str, base_currency: str, days: int
-    ) -> Optional[List[HistoricalRate]]:
+        return await self.run_read(query)
+
+    async def save_rate_rows(
+        self, rows: Iterable[RateRow], batch_size: Optional[int] = None
+    ) -> int:
         """
-        Gets historical exchange rates for a given currency pair from the database.
+        Upserts RUB exchange rates of any number of currencies in a single transaction.
+        Rows whose stored rate is unchanged are skipped. Returns the number of written rows.
         """
-        today = date.today()
-        start_date = today - timedelta(days=days - 1)
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        normalized = [
+            (currency.upper(), rate_date, rate)
+            for currency, rate_date, rate in rows
+            if currency.upper() != "RUB"
+        ]
+
+        def query(conn: sqlite3.Connection) -> int:
+            return self._upsert_rows(conn, normalized, batch_size or self.batch_size)
+
+        return await self.run_write(query)
+
+    @staticmethod
+    def _upsert_rows(
+        conn: sqlite3.Connection, rows: Iterable[RateRow], batch_size: int
+    ) -> int:
+        rows = list(rows)
+        conn.executemany(
+            "INSERT OR IGNORE INTO currencies (code) VALUES (?)",
+            [(code,) for code in {row[0] for row in rows}],
+        )
+        changes_before = conn.total_changes
+        iterator = (
+            (currency, to_day(date.fromisoformat(rate_date)), rate)
+            for currency, rate_date, rate in rows
+        )
+        while batch := list(islice(iterator, batch_size)):
+            conn.executemany(UPSERT_RATE_SQL, batch)
+        return conn.total_changes - changes_before
+
+    async def save_catalogue(self, currencies: Iterable[Currency]) -> None:
+        """
+        Replaces the listed currencies with `currencies`. Currencies no longer
+        listed keep their rows, since their stored rates still refer to them.
+        """
+        rows = [
+            (c.code, c.name, c.nominal, c.cbr_id) for c in currencies if c.code != "RUB"
+        ]
+
+        def query(conn: sqlite3.Connection) -> None:
+            conn.execute("UPDATE currencies SET listed = 0 WHERE listed = 1")
+            conn.executemany(
                 """
-                SELECT date, rate FROM historical_rates
-                WHERE currency = ? AND base_currency = ? AND date >= ?
-                ORDER BY date ASC
+                INSERT INTO currencies (code, name, nominal, cbr_id, listed)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT(code) DO UPDATE SET
+                    name = excluded.name,
+                    nominal = excluded.nominal,
+                    cbr_id = excluded.cbr_id,
+                    listed = 1
                 """,
-                (currency.upper(), base_currency.upper(), start_date.isoformat()),
+                rows,
             )
-            rows = cursor.fetchall()
-            if len(rows) >= days:
-                return [HistoricalRate(date=row[0], rate=row[1]) for row in rows]
-            return None
 
-    def get_latest_rate(
-        self, currency: str, base_currency: str
-    ) -> Optional[HistoricalRate]:
+        await self.run_write(query)
+
+    async def save_unavailable_days(self, currency: str, days: Iterable[date]) -> int:
         """
-        Gets the latest exchange rate for a given currency pair.
+        Records days the CBR publishes no rate of a currency for, so they are
+        no longer reported missing. Returns the number of new days.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        code = currency.upper()
+        rows = [(code, to_day(day)) for day in days]
+        if not rows or code == "RUB":
+            return 0
+
+        def query(conn: sqlite3.Connection) -> int:
+            conn.execute("INSERT OR IGNORE INTO currencies (code) VALUES (?)", (code,))
+            changes_before = conn.total_changes
+            conn.executemany(
                 """
-                SELECT date, rate FROM historical_rates
-                WHERE currency = ? AND base_currency = ?
-                ORDER BY date DESC
-                LIMIT 1
+                INSERT OR IGNORE INTO unavailable (currency_id, day)
+                VALUES ((SELECT id FROM currencies WHERE code = ?), ?)
                 """,
-                (currency.upper(), base_currency.upper()),
+                rows,
             )
-            row = cursor.fetchone()
-            if row:
-                return HistoricalRate(date=row[0], rate=row[1])
-            return None
+            return conn.total_changes - changes_before
 
-    def get_missing_dates(
-        self, currency: str, base_currency: str, days: int
-    ) -> List[date]:
+        return await self.run_write(query)
+
+    async def get_currency_ids(self) -> Dict[str, Optional[str]]:
         """
-        Returns list of dates for which we don't have data in the specified period.
+        Gets the CBR id of every stored currency by code, listed or not.
         """
-        today = date.today()
-        start_date = today - timedelta(days=days - 1)
 
-        all_dates = []
-        current_date = start_date
-        while current_date <= today:
-            all_dates.append(current_date)
-            current_date += timedelta(days=1)
+        def query(conn: sqlite3.Connection) -> Dict[str, Optional[str]]:
+            return dict(conn.execute("SELECT code, cbr_id FROM currencies").fetchall())
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        return await self.run_read(query)
+
+    async def get_catalogue(self) -> List[Currency]:
+        """
+        Gets the currencies listed by the latest publication, by code.
+        """
+
+        def query(conn: sqlite3.Connection) -> List[Currency]:
+            rows = conn.execute(
+                """
+                SELECT code, name, nominal, cbr_id FROM currencies
+                WHERE listed = 1
+                ORDER BY code
                 """
-                SELECT DISTINCT date FROM historical_rates
-                WHERE currency = ? AND base_currency = ? AND date >= ?
+            ).fetchall()
+            return [Currency(*row) for row in rows]
+
+        return await self.run_read(query)
+
+    async def get_rate_matrix_rows(
+        self, currencies: Iterable[str], start_date: date, end_date: date
+    ) -> List[Tuple[str, int, float]]:
+        """
+        Gets (code, day offset from start_date, RUB rate) rows of many currencies in a range.
+        """
+        codes = list(dict.fromkeys(code.upper() for code in currencies))
+        if not codes:
+            return []
+
+        def query(conn: sqlite3.Connection) -> List[Tuple[str, int, float]]:
+            first_day = to_day(start_date)
+            cursor = conn.execute(
+                f"""
+                SELECT c.code, r.day - ?, r.rate FROM rates r
+                JOIN currencies c ON c.id = r.currency_id
+                WHERE c.code IN ({", ".join("?" for _ in codes)})
+                    AND r.day BETWEEN ? AND ?
                 """,
-                (currency.upper(), base_currency.upper(), start_date.isoformat()),
+                (first_day, *codes, first_day, to_day(end_date)),
             )
-            existing_dates = [date.fromisoformat(row[0]) for row in cursor.fetchall()]
+            return cursor.fetchall()
 
-        return [d for d in all_dates if d not in existing_dates]
+        return await self.run_read(query)
 
-    def get_missing_dates_for_range(
-        self, currency: str, base_currency: str, start_date: date, end_date: date
-    ) -> List[date]:
+    async def get_first_rate_date(self) -> Optional[date]:
         """
-        Returns list of dates for which we don't have data in the specified date range.
+        Gets the earliest date with any stored rate.
         """
-        all_dates = []
-        current_date = start_date
-        while current_date <= end_date:
-            all_dates.append(current_date)
-            current_date += timedelta(days=1)
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        def query(conn: sqlite3.Connection) -> Optional[date]:
+            row = conn.execute("SELECT MIN(day) FROM rates").fetchone()
+            return from_day(row[0]) if row[0] is not None else None
+
+        return await self.run_read(query)
+
+    async def get_complete_currencies(
+        self, start_date: date, end_date: date
+    ) -> List[str]:
+        """
+        Gets the currencies with a stored rate for every day of a range.
+        """
+
+        def query(conn: sqlite3.Connection) -> List[str]:
+            rows = conn.execute(
                 """
-                SELECT DISTINCT date FROM historical_rates
-                WHERE currency = ? AND base_currency = ? AND date >= ? AND date <= ?
+                SELECT c.code FROM rates r
+                JOIN currencies c ON c.id = r.currency_id
+                WHERE r.day BETWEEN ? AND ?
+                GROUP BY c.code
+                HAVING COUNT(*) = ?
+                ORDER BY c.code
                 """,
                 (
-                    currency.upper(),
-                    base_currency.upper(),
-                    start_date.isoformat(),
-                    end_date.isoformat(),
+                    to_day(start_date),
+                    to_day(end_date),
+                    (end_date - start_date).days + 1,
                 ),
-            )
-            existing_dates = [date.fromisoformat(row[0]) for row in cursor.fetchall()]
+            ).fetchall()
+            return [row[0] for row in rows]
+
+        return await self.run_read(query)
+
+    async def get_missing_intervals(
+        self, currencies: Iterable[str], start_date: date, end_date: date
+    ) -> Dict[str, List[Tuple[date, date]]]:
+        """
+        Returns the missing RUB rate intervals of many currencies in a single query.
+        Currencies without gaps are left out of the result.
+        """
+        codes = list(dict.fromkeys(code.upper() for code in currencies))
+        codes = [code for code in codes if code != "RUB"]
+        if not codes or start_date > end_date:
+            return {}
+
+        def query(conn: sqlite3.Connection) -> List[Tuple[str, int, int]]:
+            return conn.execute(
+                MISSING_INTERVALS_SQL.format(codes=", ".join("(?)" for _ in codes)),
+                (to_day(start_date), to_day(end_date), *codes),
+            ).fetchall()
+
+        gaps: Dict[str, List[Tuple[date, date]]] = {}
+        for code, first_day, last_day in await self.run_read(query):
+            gaps.setdefault(code, []).append((from_day(first_day), from_day(last_day)))
+        return gaps
+
 
-        return [d for d in all_dates if d not in existing_dates]
+def expand_date_intervals(intervals: Iterable[Tuple[date, date]]) -> List[date]:
+    """
+    Expands inclusive (start, end) intervals back into the dates they cover.
+    """
+    return [
+        start_date + timedelta(days=offset)
+        for start_date, end_date in intervals
+        for offset in range((end_date - start_date).days + 1)
+    ]
@@ -0,0 +1,189 @@
+import sqlite3
+from datetime import date, timedelta
+from loguru import logger
+
+# Version 1 is the original layout: one `historical_rates` row per
+# (currency, base_currency, date) with TEXT columns.
+# Version 2 stores only RUB-anchored rates with integer days and interned
+# currency ids; any other base is derived at query time.
+# Version 3 adds the `jobs` table of background jobs.
+# Version 4 keeps the currency catalogue (name, nominal, CBR id and whether the
+# latest publication lists it) on `currencies`.
+# Version 5 adds `unavailable`, the days the CBR has no rate of a currency for,
+# such as before it was listed or after it was delisted.
+SCHEMA_VERSION = 5
+
+CATALOGUE_COLUMNS = (
+    ("name", "TEXT"),
+    ("nominal", "INTEGER"),
+    ("cbr_id", "TEXT"),
+    ("listed", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+EPOCH = date(1970, 1, 1)
+
+
+def to_day(value: date) -> int:
+    """Days since 1970-01-01, the integer date used by the `rates` table."""
+    return (value - EPOCH).days
+
+
+def from_day(day: int) -> date:
+    return EPOCH + timedelta(days=day)
+
+
+def init_schema(conn: sqlite3.Connection) -> None:
+    """
+    Create the current schema, migrating an existing database if needed.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'historical_rates'"
+    ).fetchone()
+
+    with conn:
+        _create_tables(conn)
+        _add_catalogue_columns(conn)
+        if legacy:
+            _migrate_from_v1(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    if legacy:
+        # Reclaim the space of the dropped tables; must run outside a transaction.
+        conn.execute("VACUUM")
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS currencies (
+            id INTEGER PRIMARY KEY,
+            code TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rates (
+            currency_id INTEGER NOT NULL REFERENCES currencies (id),
+            day INTEGER NOT NULL,
+            rate REAL NOT NULL,
+            PRIMARY KEY (currency_id, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS unavailable (
+            currency_id INTEGER NOT NULL REFERENCES currencies (id),
+            day INTEGER NOT NULL,
+            PRIMARY KEY (currency_id, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            day INTEGER PRIMARY KEY,
+            document_date TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            state TEXT NOT NULL,
+            stage TEXT,
+            done INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            checkpoint TEXT,
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            lease_until REAL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            eta REAL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, kind)")
+
+
+def _add_catalogue_columns(conn: sqlite3.Connection) -> None:
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(currencies)")}
+    for name, definition in CATALOGUE_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE currencies ADD COLUMN {name} {definition}")
+
+
+def _migrate_from_v1(conn: sqlite3.Connection) -> None:
+    """
+    Move `historical_rates` and `rate_snapshots` into the RUB-anchored tables.
+    Cross rows and inverted RUB/base rows are kept only where they fill a day
+    without a RUB row.
+    """
+    epoch = f"julianday('{EPOCH.isoformat()}')"
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO currencies (code)
+        SELECT DISTINCT currency FROM historical_rates WHERE currency != 'RUB'
+        UNION
+        SELECT DISTINCT base_currency FROM historical_rates WHERE base_currency != 'RUB'
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT OR REPLACE INTO rates (currency_id, day, rate)
+        SELECT c.id, CAST(julianday(h.date) - {epoch} AS INTEGER), h.rate
+        FROM historical_rates h
+        JOIN currencies c ON c.code = h.currency
+        WHERE h.base_currency = 'RUB'
+        """
+    )
+    # RUB quoted in another base is the inverse of that base's RUB rate.
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO rates (currency_id, day, rate)
+        SELECT c.id, CAST(julianday(h.date) - {epoch} AS INTEGER), 1.0 / h.rate
+        FROM historical_rates h
+        JOIN currencies c ON c.code = h.base_currency
+        WHERE h.currency = 'RUB' AND h.base_currency != 'RUB' AND h.rate > 0
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO rates (currency_id, day, rate)
+        SELECT c.id, b.day, h.rate * b.rate
+        FROM historical_rates h
+        JOIN currencies c ON c.code = h.currency
+        JOIN currencies bc ON bc.code = h.base_currency
+        JOIN rates b
+            ON b.currency_id = bc.id
+            AND b.day = CAST(julianday(h.date) - {epoch} AS INTEGER)
+        WHERE h.base_currency != 'RUB' AND h.currency != 'RUB'
+        """
+    )
+    has_snapshots = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rate_snapshots'"
+    ).fetchone()
+    if has_snapshots:
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO snapshots (day, document_date)
+            SELECT CAST(julianday(date) - {epoch} AS INTEGER), document_date
+            FROM rate_snapshots
+            """
+        )
+        conn.execute("DROP TABLE rate_snapshots")
+    conn.execute("DROP TABLE historical_rates")
+
+    migrated = conn.execute("SELECT COUNT(*) FROM rates").fetchone()[0]
+    logger.info(f"Migrated {migrated} RUB-anchored rates to schema v{SCHEMA_VERSION}")
@@ -0,0 +1,81 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from litestar import Request, Response
+from litestar.status_codes import HTTP_304_NOT_MODIFIED
+
+# One year, the conventional ceiling for content that never changes.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Used once an expected publication is overdue, so clients pick it up soon.
+OVERDUE_MAX_AGE = 300
+
+
+def strong_etag(*parts: object) -> str:
+    """
+    A strong ETag derived from the given values or response bytes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def cache_until(expires: datetime, now: Optional[datetime] = None) -> str:
+    """
+    Cache-Control letting clients and proxies reuse a response until `expires`.
+    """
+    now = now or datetime.now(timezone.utc)
+    max_age = int((expires - now).total_seconds())
+    return f"public, max-age={max_age if max_age > 0 else OVERDUE_MAX_AGE}"
+
+
+def conditional_response(
+    request: Request[Any, Any, Any],
+    content: bytes,
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[datetime] = None,
+    vary: Optional[str] = None,
+) -> Response[bytes]:
+    """
+    Respond with `content`, or with 304 Not Modified when the client's
+    If-None-Match (or, without it, If-Modified-Since) shows it already has it.
+    """
+    headers: Dict[str, str] = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        last_modified = min(last_modified, datetime.now(timezone.utc))
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    if vary is not None:
+        headers["Vary"] = vary
+
+    if _not_modified(request, etag, last_modified):
+        return Response(b"", status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content, media_type=media_type, headers=headers)
+
+
+def _not_modified(
+    request: Request[Any, Any, Any], etag: str, last_modified: Optional[datetime]
+) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match.
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a resolution of one second.
+    return last_modified.replace(microsecond=0) <= since
@@ -1,98 +1,388 @@
-from litestar import Router, get, post
+from litestar import Request, Response, Router, get, post
+from litestar.datastructures import State
 from litestar.exceptions import HTTPException
 from litestar.di import Provide
-from litestar.status_codes import HTTP_400_BAD_REQUEST
-from services.exchanges import ExchangesService
-from config import get_config, Config
+from litestar.response import ServerSentEvent, ServerSentEventMessage
+from litestar.status_codes import (
+    HTTP_202_ACCEPTED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_406_NOT_ACCEPTABLE,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+from services.cbr_client import is_upstream_failure
+from services.circuit_breaker import CircuitOpenError
+from services.encoding import (
+    JSON,
+    RateColumns,
+    encode,
+    media_types,
+    to_historical_batch,
+    to_historical_rates,
+    to_historical_series,
+)
+from services.exchanges import DEFAULT_LTTB_POINTS, PRELOAD_JOB, ExchangesService
+from services.jobs import JobManager
+from services.publication import parse_document_date
+from routes.conditional import (
+    IMMUTABLE_CACHE_CONTROL,
+    cache_until,
+    conditional_response,
+    strong_etag,
+)
 from models.currency import ExchangeRates
-from typing import Optional, Dict, List, Union
+from models.job import Job
+from routes.jobs import get_job_manager
+from typing import Any, AsyncGenerator, Callable, Optional, Dict, List, Tuple
 from datetime import date
+from loguru import logger
+import asyncio
+import math
+import msgspec
+
+
+# Comments sent on idle streams keep proxies from closing them.
+STREAM_KEEPALIVE_INTERVAL = 30.0
+# Whether every day of a historical response up to today is known
+COMPLETE_HEADER = "X-Data-Complete"
+PARTIAL_CACHE_CONTROL = "no-cache"
 
 
-async def get_exchanges_service() -> ExchangesService:
-    config = get_config()
-    return ExchangesService(config=config)
+def get_exchanges_service(state: State) -> ExchangesService:
+    exchanges_service: ExchangesService = state.exchanges_service
+    return exchanges_service
+
+
+def negotiate_media_type(request: Request[Any, Any, Any]) -> str:
+    """
+    Pick the response encoding from the Accept header; JSON unless asked otherwise.
+    """
+    media_type = request.accept.best_match(media_types())
+    if media_type is None:
+        raise HTTPException(
+            detail=f"Supported media types: {', '.join(media_types())}",
+            status_code=HTTP_406_NOT_ACCEPTABLE,
+        )
+    return media_type
+
+
+def columns_response(
+    request: Request[Any, Any, Any],
+    exchanges_service: ExchangesService,
+    columns: RateColumns,
+    media_type: str,
+    to_json: Callable[[RateColumns], Any],
+) -> Response[bytes]:
+    """
+    Encode columns as negotiated. Complete ranges that ended before today can
+    no longer change, and complete ones up to today stay fresh until the next
+    CBR publication. Partial ones, whose missing days are being fetched in
+    the background, must be revalidated on every use.
+    """
+    if media_type == JSON:
+        content = msgspec.json.encode(to_json(columns))
+    else:
+        content = encode(columns, media_type)
+    if not columns.complete:
+        cache_control = PARTIAL_CACHE_CONTROL
+    elif date.fromisoformat(columns.meta["end"]) < date.today():
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = cache_until(exchanges_service.publications.next_publication())
+    response = conditional_response(
+        request,
+        content,
+        media_type,
+        etag=strong_etag(content),
+        cache_control=cache_control,
+        vary="Accept",
+    )
+    response.headers[COMPLETE_HEADER] = "true" if columns.complete else "false"
+    return response
+
+
+def rates_response(
+    request: Request[Any, Any, Any],
+    exchanges_service: ExchangesService,
+    rates: ExchangeRates,
+    requested_date: Optional[date],
+) -> Response[bytes]:
+    """
+    Rates are identified by their base and CBR document date, and stay current
+    until the next document is expected; tables of past dates never change.
+    """
+    publications = exchanges_service.publications
+    document_date = parse_document_date(rates.last_updated)
+    if requested_date is not None and requested_date < date.today():
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    elif document_date is not None:
+        cache_control = cache_until(publications.next_after(document_date))
+    else:
+        cache_control = cache_until(publications.next_publication())
+    return conditional_response(
+        request,
+        msgspec.json.encode(rates),
+        JSON,
+        etag=strong_etag(rates.base, rates.last_updated),
+        cache_control=cache_control,
+        last_modified=(
+            publications.published_at(document_date)
+            if document_date is not None
+            else None
+        ),
+    )
 
 
 @get("/rates/{base_currency:str}")
 async def get_rates(
+    request: Request[Any, Any, Any],
     exchanges_service: ExchangesService,
     base_currency: str = "USD",
     date: Optional[date] = None,
-) -> ExchangeRates:
+) -> Response[bytes]:
     try:
-        return await exchanges_service.get_all_currency_exchange_rates(
+        rates = await exchanges_service.get_all_currency_exchange_rates(
             base_currency=base_currency, date=date
         )
     except ValueError as e:
         raise HTTPException(detail=str(e), status_code=HTTP_400_BAD_REQUEST)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
     except Exception as e:
         raise HTTPException(detail="Internal server error", status_code=500)
+    return rates_response(request, exchanges_service, rates, date)
+
+
+@get("/stream/{base_currency:str}")
+async def stream_rates(
+    exchanges_service: ExchangesService, base_currency: str = "USD"
+) -> ServerSentEvent:
+    """Stream the latest rates now and again after every new CBR publication"""
+    try:
+        rates = await exchanges_service.get_all_currency_exchange_rates(
+            base_currency=base_currency
+        )
+    except ValueError as e:
+        raise HTTPException(detail=str(e), status_code=HTTP_400_BAD_REQUEST)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except Exception as e:
+        raise HTTPException(detail="Internal server error", status_code=500)
+    return ServerSentEvent(
+        rate_events(exchanges_service, rates),
+        # Ask reverse proxies not to buffer the stream.
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+async def rate_events(
+    exchanges_service: ExchangesService, rates: ExchangeRates
+) -> AsyncGenerator[ServerSentEventMessage, None]:
+    async with exchanges_service.updates.subscribe() as updates:
+        last_sent = None
+        while True:
+            if rates.last_updated != last_sent:
+                yield ServerSentEventMessage(
+                    data=msgspec.json.encode(rates).decode(),
+                    event="rates",
+                    id=rates.last_updated,
+                )
+                last_sent = rates.last_updated
+            try:
+                await asyncio.wait_for(updates.get(), STREAM_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ServerSentEventMessage(comment="keep-alive")
+                continue
+            try:
+                rates = await exchanges_service.get_all_currency_exchange_rates(
+                    base_currency=rates.base
+                )
+            except Exception as e:
+                logger.warning(f"Failed to reload {rates.base} rates for a stream: {e}")
 
 
 @get("/historical/{currency:str}/{base_currency:str}/{days:int}")
 async def get_historical_rates(
+    request: Request[Any, Any, Any],
     exchanges_service: ExchangesService,
     currency: str,
     base_currency: str,
     days: int = 30,
-) -> List[Dict[str, Union[str, float]]]:  # Исправлено здесь
+) -> Response[bytes]:
     """Get historical exchange rates"""
+    if days < 1:
+        raise HTTPException(
+            detail="days must be positive", status_code=HTTP_400_BAD_REQUEST
+        )
+    media_type = negotiate_media_type(request)
     try:
-        rates = await exchanges_service.get_historical_rates(
-            currency, base_currency, days
+        columns = await exchanges_service.get_recent_rate_series(
+            currency.upper(), base_currency.upper(), days
         )
-        return [{"date": r.date, "rate": r.rate} for r in rates]
+        return columns_response(
+            request, exchanges_service, columns, media_type, to_historical_rates
+        )
+    except ValueError as e:
+        raise HTTPException(detail=str(e), status_code=HTTP_400_BAD_REQUEST)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@post("/update-rates")
-async def update_rates(exchanges_service: ExchangesService) -> Dict[str, str]:
-    """Update database with latest rates"""
+@get("/historical/batch")
+async def get_rate_history_batch(
+    request: Request[Any, Any, Any],
+    exchanges_service: ExchangesService,
+    pairs: List[str],
+    start: date,
+    end: Optional[date] = None,
+    fill: str = "none",
+) -> Response[bytes]:
+    """Get exchange rates of several pairs (CUR/BASE) over one date range, columnar"""
+    media_type = negotiate_media_type(request)
     try:
-        await exchanges_service.update_daily_rates()
-        return {"status": "success", "message": "Rates updated successfully"}
+        requested = [
+            parse_pair(pair) for value in pairs for pair in value.split(",") if pair
+        ]
+        columns = await exchanges_service.get_rate_series_batch(
+            requested, start, end or date.today(), fill
+        )
+        return columns_response(
+            request, exchanges_service, columns, media_type, to_historical_batch
+        )
+    except ValueError as e:
+        raise HTTPException(detail=str(e), status_code=HTTP_400_BAD_REQUEST)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@post("/preload-data/{days:int}")
-async def preload_historical_data(
+def upstream_unavailable(error: CircuitOpenError) -> HTTPException:
+    return HTTPException(
+        detail=str(error),
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
+
+
+def parse_pair(value: str) -> Tuple[str, str]:
+    currency, separator, base_currency = value.strip().upper().partition("/")
+    if not separator or not currency or not base_currency:
+        raise ValueError(f"Invalid pair {value}, expected CUR/BASE")
+    return currency, base_currency
+
+
+@get("/historical/{currency:str}/{base_currency:str}")
+async def get_rate_history(
+    request: Request[Any, Any, Any],
     exchanges_service: ExchangesService,
-    days: int = 180,
-) -> Dict[str, str]:
-    """Manually trigger historical data preload"""
+    currency: str,
+    base_currency: str,
+    start: date,
+    end: Optional[date] = None,
+    resolution: str = "daily",
+    points: int = DEFAULT_LTTB_POINTS,
+    fill: str = "none",
+) -> Response[bytes]:
+    """Get exchange rates of a date range, optionally downsampled"""
+    if points < 3:
+        raise HTTPException(
+            detail="At least 3 points are required", status_code=HTTP_400_BAD_REQUEST
+        )
+    media_type = negotiate_media_type(request)
+    try:
+        columns = await exchanges_service.get_rate_series(
+            currency.upper(),
+            base_currency.upper(),
+            start,
+            end or date.today(),
+            resolution=resolution,
+            points=points,
+            fill=fill,
+        )
+        return columns_response(
+            request, exchanges_service, columns, media_type, to_historical_series
+        )
+    except ValueError as e:
+        raise HTTPException(detail=str(e), status_code=HTTP_400_BAD_REQUEST)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@post("/update-rates")
+async def update_rates(exchanges_service: ExchangesService) -> Dict[str, str]:
+    """Update database with latest rates"""
     try:
-        await exchanges_service.preload_historical_data(days=days)
+        published = await exchanges_service.update_daily_rates()
         return {
             "status": "success",
-            "message": f"Preloaded {days} days of historical data",
+            "message": ("New rates published" if published else "Rates are up to date"),
         }
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
     except Exception as e:
+        if is_upstream_failure(e):
+            raise HTTPException(
+                detail=f"CBR request failed: {e}",
+                status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            )
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@post("/preload-data/{days:int}", status_code=HTTP_202_ACCEPTED)
+async def preload_historical_data(
+    jobs: JobManager,
+    days: int = 180,
+) -> Response[Job]:
+    """
+    Start a background job preloading historical data; poll its status at the
+    returned Location. An identical preload already running is returned instead.
+    """
+    if days < 1:
+        raise HTTPException(
+            detail="days must be positive", status_code=HTTP_400_BAD_REQUEST
+        )
+    job = await jobs.submit(PRELOAD_JOB, {"days": days})
+    return Response(
+        job,
+        status_code=HTTP_202_ACCEPTED,
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
+
+
 @get("/currencies")
 async def get_available_currencies(
+    request: Request[Any, Any, Any],
     exchanges_service: ExchangesService,
-) -> Dict[str, List[str]]:
-    """Get list of all available currencies"""
-    try:
-        currencies = await exchanges_service.get_all_available_currencies()
-        return {"currencies": currencies}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+) -> Response[bytes]:
+    """Get the codes, names, nominals and CBR ids of all available currencies"""
+    catalogue = await exchanges_service.get_currency_catalogue()
+    return conditional_response(
+        request,
+        catalogue.body,
+        JSON,
+        catalogue.etag,
+        cache_until(exchanges_service.publications.next_publication()),
+    )
 
 
 exchanges_router = Router(
     path="/api/currency",
     route_handlers=[
         get_rates,
+        stream_rates,
         get_historical_rates,
+        get_rate_history,
+        get_rate_history_batch,
         update_rates,
         preload_historical_data,
         get_available_currencies,
     ],
-    dependencies={"exchanges_service": Provide(get_exchanges_service)},
+    dependencies={
+        "exchanges_service": Provide(get_exchanges_service, sync_to_thread=False),
+        "jobs": Provide(get_job_manager, sync_to_thread=False),
+    },
 )
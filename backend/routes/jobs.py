@@ -0,0 +1,45 @@
+from typing import List
+
+from litestar import Router, get, post
+from litestar.datastructures import State
+from litestar.di import Provide
+from litestar.exceptions import NotFoundException
+from litestar.status_codes import HTTP_202_ACCEPTED
+from models.job import Job
+from services.jobs import JobManager
+
+
+def get_job_manager(state: State) -> JobManager:
+    jobs: JobManager = state.jobs
+    return jobs
+
+
+@get("/")
+async def list_jobs(jobs: JobManager, limit: int = 20) -> List[Job]:
+    """Most recent background jobs"""
+    return await jobs.recent(limit)
+
+
+@get("/{job_id:str}")
+async def get_job(jobs: JobManager, job_id: str) -> Job:
+    """Status and progress of a background job"""
+    job = await jobs.get(job_id)
+    if job is None:
+        raise NotFoundException(detail=f"Job {job_id} not found")
+    return job
+
+
+@post("/{job_id:str}/cancel", status_code=HTTP_202_ACCEPTED)
+async def cancel_job(jobs: JobManager, job_id: str) -> Job:
+    """Cancel a background job; a running one stops within a poll interval"""
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise NotFoundException(detail=f"Job {job_id} not found")
+    return job
+
+
+jobs_router = Router(
+    path="/api/jobs",
+    route_handlers=[list_jobs, get_job, cancel_job],
+    dependencies={"jobs": Provide(get_job_manager, sync_to_thread=False)},
+)
@@ -0,0 +1,456 @@
+import asyncio
+import base64
+import json
+from contextlib import asynccontextmanager
+from functools import partial
+from uuid import uuid4
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    TypeVar,
+    Union,
+)
+from dataclasses import asdict
+from loguru import logger
+import numpy as np
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+from config import Config
+from models import ExchangeRates
+from services.memory_cache import MemoryCache
+from services.rate_matrix import FloatArray
+from services.single_flight import SingleFlight
+
+T = TypeVar("T")
+
+INVALIDATION_CHANNEL = "rates:invalidate"
+
+LOCK_POLL_INTERVAL = 0.05
+
+PACKED_ARRAY_PREFIX = "f8:"
+
+# Delete the lock only if it still holds our token, i.e. it did not expire
+# and get taken over by another worker in the meantime.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Take the lease if it is free, or extend it if it already holds our token.
+HOLD_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+if redis.call("set", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+
+class RatesCache:
+    """
+    Async Redis cache for rate lookups.
+    Every operation is bounded by a timeout and degrades to a cache miss, so a
+    slow or unavailable Redis never stalls the event loop.
+    Decoded values are also kept in an in-process tier in front of Redis.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Redis],
+        timeout: float = 0.5,
+        default_ttl: int = 3600,
+        memory: Optional[MemoryCache] = None,
+        lock_timeout: float = 10.0,
+    ) -> None:
+        self._client = client
+        self._timeout = timeout
+        self._default_ttl = default_ttl
+        self.memory = memory if memory is not None else MemoryCache()
+        self._lock_timeout = lock_timeout
+        self._flights = SingleFlight()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    @classmethod
+    def from_config(cls, config: Config) -> "RatesCache":
+        pool = ConnectionPool(
+            host=config.redis_host,
+            port=config.redis_port,
+            db=config.redis_db,
+            decode_responses=True,
+            socket_timeout=config.redis_timeout,
+            socket_connect_timeout=config.redis_timeout,
+            max_connections=config.redis_max_connections,
+        )
+        return cls(
+            Redis(connection_pool=pool),
+            timeout=config.redis_timeout,
+            default_ttl=config.cache_ttl,
+            memory=MemoryCache(
+                max_entries=config.memory_cache_max_entries,
+                ttl=config.memory_cache_ttl,
+                stale_ttl=config.memory_cache_stale_ttl,
+            ),
+            lock_timeout=config.cache_lock_timeout,
+        )
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def get(self, key: str) -> Optional[str]:
+        if self._client is None:
+            return None
+        return _decode(await self._run(self._client.get(key)))
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Read several keys in a single round trip.
+        """
+        if self._client is None or not keys:
+            return {key: None for key in keys}
+        values = await self._run(self._client.mget(keys))
+        if values is None:
+            return {key: None for key in keys}
+        return {key: _decode(value) for key, value in zip(keys, values)}
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        if self._client is None:
+            return
+        await self._run(self._client.setex(key, ttl or self._default_ttl, value))
+
+    async def set_many(self, values: Dict[str, str], ttl: Optional[int] = None) -> None:
+        """
+        Write several keys with the same TTL in a single pipelined round trip.
+        """
+        if self._client is None or not values:
+            return
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.setex(key, ttl or self._default_ttl, value)
+        await self._run(pipeline.execute())
+
+    async def get_json(self, key: str) -> Optional[Any]:
+        cached_data = await self.get(key)
+        if cached_data is None:
+            return None
+        try:
+            return json.loads(cached_data)
+        except json.JSONDecodeError:
+            return None
+
+    async def set_json(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        await self.set(key, json.dumps(value), ttl)
+
+    async def get_exchange_rates(self, key: str) -> Optional[ExchangeRates]:
+        return await self._get_decoded(key, _exchange_rates_from_json)
+
+    async def set_exchange_rates(
+        self, key: str, exchange_rates: ExchangeRates, ttl: Optional[int] = None
+    ) -> None:
+        self.memory.set(key, exchange_rates, ttl)
+        await self.set_json(key, asdict(exchange_rates), ttl)
+
+    async def get_arrays(self, keys: List[str]) -> Dict[str, Optional[FloatArray]]:
+        """
+        Read float arrays (NaN for unknown values) of several keys in one round trip.
+        """
+        values: Dict[str, Optional[FloatArray]] = {
+            key: self.memory.get_fresh(key) for key in keys
+        }
+        missing = [key for key, value in values.items() if value is None]
+        for key, cached in (await self.get_many(missing)).items():
+            array = _unpack_array(cached)
+            if array is not None:
+                self.memory.set(key, array)
+            values[key] = array
+        return values
+
+    async def set_arrays(
+        self, values: Dict[str, FloatArray], ttl: Optional[int] = None
+    ) -> None:
+        for key, value in values.items():
+            self.memory.set(key, value, ttl)
+        await self.set_many(
+            {key: _pack_array(value) for key, value in values.items()}, ttl
+        )
+
+    async def get_or_load(
+        self,
+        key: str,
+        read: Callable[[str], Awaitable[Optional[T]]],
+        write: Callable[[str, T], Awaitable[None]],
+        load: Callable[[], Awaitable[T]],
+    ) -> T:
+        """
+        Serve `key` from the in-process tier, then Redis, then `load`.
+        A stale in-process entry is returned immediately and refreshed in the
+        background (stale-while-revalidate). Empty results are not cached.
+        """
+        entry = self.memory.get(key)
+        if entry is not None:
+            value: T = entry[0]
+            if not entry[1]:
+                self._revalidate(key, read, write, load)
+            return value
+
+        # Concurrent misses of a key share one load in this worker, and the
+        # Redis lock lets a single worker compute it for the others.
+        return await self._flights.do(
+            key, partial(self._load_shared, key, read, write, load)
+        )
+
+    async def _load_shared(
+        self,
+        key: str,
+        read: Callable[[str], Awaitable[Optional[T]]],
+        write: Callable[[str, T], Awaitable[None]],
+        load: Callable[[], Awaitable[T]],
+    ) -> T:
+        cached = await read(key)
+        if cached is not None:
+            return cached
+
+        async with self._lock(key) as owner:
+            if not owner:
+                cached = await self._wait_for(key, read)
+                if cached is not None:
+                    return cached
+
+            loaded = await load()
+            if loaded:
+                await write(key, loaded)
+            return loaded
+
+    @asynccontextmanager
+    async def _lock(self, key: str) -> AsyncIterator[bool]:
+        """
+        Hold the cross-worker lock of a key. Yields False when another worker
+        holds it; an unavailable Redis counts as holding it ourselves.
+        """
+        if self._client is None:
+            yield True
+            return
+        client = self._client
+        lock_key = f"lock:{key}"
+        token = uuid4().hex
+
+        async def acquire() -> bool:
+            return bool(
+                await client.set(
+                    lock_key, token, nx=True, px=int(self._lock_timeout * 1000)
+                )
+            )
+
+        acquired = await self._run(acquire())
+        if acquired is False:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await self._run(client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token))
+
+    async def _wait_for(
+        self, key: str, read: Callable[[str], Awaitable[Optional[T]]]
+    ) -> Optional[T]:
+        """
+        Poll for the value another worker is computing until its lock goes away.
+        """
+        if self._client is None:
+            return None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._lock_timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            cached = await read(key)
+            if cached is not None:
+                return cached
+            if not await self._run(self._client.exists(f"lock:{key}")):
+                break
+        return None
+
+    def _revalidate(
+        self,
+        key: str,
+        read: Callable[[str], Awaitable[Optional[T]]],
+        write: Callable[[str, T], Awaitable[None]],
+        load: Callable[[], Awaitable[T]],
+    ) -> None:
+        if self._flights.in_flight(key):
+            return
+
+        async def refresh() -> None:
+            try:
+                # Another worker may already have refreshed the shared tier;
+                # the stale entry is not fresh, so `read` goes to Redis.
+                await self._flights.do(
+                    key, partial(self._load_shared, key, read, write, load)
+                )
+            except Exception as e:
+                logger.warning(f"Failed to revalidate {key}: {e}")
+
+        self._spawn(refresh())
+
+    async def invalidate(self, patterns: List[str]) -> None:
+        """
+        Drop keys matching the glob patterns here, in Redis and in every other
+        worker subscribed to the invalidation channel.
+        """
+        self.memory.invalidate(patterns)
+        if self._client is None:
+            return
+        client = self._client
+
+        async def run() -> None:
+            keys = [
+                key
+                for pattern in patterns
+                async for key in client.scan_iter(match=pattern, count=500)
+            ]
+            if keys:
+                await client.delete(*keys)
+            await client.publish(INVALIDATION_CHANNEL, json.dumps(patterns))
+
+        await self._run(run(), timeout=self._timeout * 10)
+
+    async def publish(self, channel: str, message: str) -> int:
+        """
+        Publish a message to every subscribed worker; returns how many received it.
+        """
+        if self._client is None:
+            return 0
+        receivers = await self._run(self._client.publish(channel, message))
+        return receivers or 0
+
+    async def listen(
+        self, handlers: Optional[Mapping[str, Callable[[str], None]]] = None
+    ) -> None:
+        """
+        Apply invalidations published by other workers, and pass messages of
+        the other channels to their handlers, until cancelled. All channels
+        share one subscription, so messages arrive in the order published.
+        """
+        if self._client is None:
+            return
+        handlers = handlers or {}
+
+        while True:
+            try:
+                async with self._client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL, *handlers)
+                    # Messages published while disconnected are lost.
+                    self.memory.clear()
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0
+                        )
+                        if message is None:
+                            continue
+                        channel = _decode(message["channel"])
+                        if channel == INVALIDATION_CHANNEL:
+                            self._apply_invalidation(message["data"])
+                        elif channel is not None and channel in handlers:
+                            handlers[channel](_decode(message["data"]) or "")
+            except (RedisError, OSError) as e:
+                logger.debug(f"Pub/sub listener disconnected: {e}")
+                await asyncio.sleep(5)
+
+    async def hold_lease(self, key: str, token: str, ttl: float) -> bool:
+        """
+        Acquire or renew a lease held under `token` for `ttl` seconds. Returns
+        False while another holder has it; an unavailable Redis counts as
+        holding it ourselves.
+        """
+        if self._client is None:
+            return True
+        held = await self._run(
+            self._client.eval(HOLD_LEASE_SCRIPT, 1, key, token, int(ttl * 1000))
+        )
+        return held is None or bool(held)
+
+    async def release_lease(self, key: str, token: str) -> None:
+        if self._client is not None:
+            await self._run(self._client.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
+
+    def _apply_invalidation(self, data: Union[bytes, str]) -> None:
+        try:
+            patterns = json.loads(_decode(data) or "[]")
+        except json.JSONDecodeError:
+            return
+        if isinstance(patterns, list):
+            self.memory.invalidate(str(pattern) for pattern in patterns)
+
+    async def _get_decoded(
+        self, key: str, decode: Callable[[Any], Optional[T]]
+    ) -> Optional[T]:
+        value: Optional[T] = self.memory.get_fresh(key)
+        if value is not None:
+            return value
+        data = await self.get_json(key)
+        value = decode(data) if data is not None else None
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def _spawn(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self, operation: Awaitable[T], timeout: Optional[float] = None
+    ) -> Optional[T]:
+        try:
+            return await asyncio.wait_for(operation, timeout=timeout or self._timeout)
+        except (RedisError, asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"Redis operation failed: {e}")
+            return None
+
+
+def _decode(value: Union[bytes, str, None]) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def _exchange_rates_from_json(data: Any) -> Optional[ExchangeRates]:
+    if not isinstance(data, dict):
+        return None
+    try:
+        return ExchangeRates(**data)
+    except TypeError:
+        return None
+
+
+def _pack_array(values: FloatArray) -> str:
+    # Raw little-endian float64 (NaN kept as is), base64 because the client
+    # decodes responses as text.
+    return PACKED_ARRAY_PREFIX + base64.b64encode(
+        values.astype("<f8", copy=False).tobytes()
+    ).decode("ascii")
+
+
+def _unpack_array(value: Optional[str]) -> Optional[FloatArray]:
+    # Values in another format, e.g. written by an older version, count as a miss.
+    if value is None or not value.startswith(PACKED_ARRAY_PREFIX):
+        return None
+    try:
+        packed = base64.b64decode(value[len(PACKED_ARRAY_PREFIX) :], validate=True)
+        return np.frombuffer(packed, dtype="<f8").astype(np.float64)
+    except ValueError:
+        return None
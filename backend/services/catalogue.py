@@ -0,0 +1,59 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+import msgspec
+
+from models import Currency
+from services.cbr_parser import DailyDocument
+
+RUB = Currency(code="RUB", name="Российский рубль", nominal=1)
+
+
+@dataclass(frozen=True)
+class CurrencyCatalogue:
+    """
+    The currencies quoted by the latest CBR publication, plus the rouble,
+    with the `/currencies` response encoded once per change.
+    """
+
+    currencies: Tuple[Currency, ...]
+    # Code -> id used by the CBR series API
+    ids: Dict[str, str]
+    body: bytes
+    etag: str
+
+    @classmethod
+    def build(cls, currencies: Iterable[Currency]) -> "CurrencyCatalogue":
+        listed = tuple(
+            sorted({c.code: c for c in (RUB, *currencies)}.values(), key=_code)
+        )
+        body = msgspec.json.encode(
+            {"currencies": [c.code for c in listed], "catalogue": listed}
+        )
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        ids = {c.code: c.cbr_id for c in listed if c.cbr_id}
+        return cls(listed, ids, body, etag)
+
+    @property
+    def codes(self) -> Tuple[str, ...]:
+        return tuple(c.code for c in self.currencies)
+
+
+def catalogue_entries(document: DailyDocument) -> Tuple[Currency, ...]:
+    """
+    The currencies a daily document quotes, by code.
+    """
+    return tuple(
+        Currency(
+            code=code,
+            name=document.names.get(code, code),
+            nominal=document.nominals.get(code, 1),
+            cbr_id=document.ids.get(code),
+        )
+        for code in sorted({*document.ids, *document.rates})
+    )
+
+
+def _code(currency: Currency) -> str:
+    return currency.code
@@ -0,0 +1,176 @@
+import asyncio
+import httpx
+from functools import partial
+from services.circuit_breaker import CircuitBreaker
+from services.single_flight import SingleFlight
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from datetime import date, timedelta
+import numpy as np
+from services.rate_matrix import forward_fill
+
+
+class CbrClient:
+    """
+    HTTP client for the CBR XML endpoints.
+    Every endpoint has its own timeout. A slow or failed request is hedged
+    once by an identical one, and a circuit breaker makes calls fail fast
+    with CircuitOpenError while the CBR keeps failing. Nothing here ever
+    sleeps; a caller that wants to retry later decides when.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        daily_timeout: Optional[float] = None,
+        dynamic_timeout: Optional[float] = None,
+        hedge_delay: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.daily_url = f"{self.base_url}/XML_daily.asp"
+        self.dynamic_url = f"{self.base_url}/XML_dynamic.asp"
+        self.timeouts = {
+            self.daily_url: daily_timeout or timeout,
+            self.dynamic_url: dynamic_timeout or timeout,
+        }
+        # None disables hedging; a failed request is then not retried either.
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker("CBR", is_failure=is_upstream_failure)
+        # One keep-alive client for the lifetime of the process instead of a
+        # new connection (and TLS handshake) per upstream call.
+        self._client = httpx.AsyncClient(
+            transport=transport,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+        self._in_flight = SingleFlight()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def fetch_daily(self, target_date: Optional[date] = None) -> bytes:
+        """
+        Fetch the daily document with rates of all currencies for a date.
+        """
+        params = {"date_req": target_date.strftime("%d.%m.%Y")} if target_date else {}
+        return await self._get(self.daily_url, params)
+
+    async def fetch_dynamic(
+        self, cbr_id: str, start_date: date, end_date: date
+    ) -> bytes:
+        """
+        Fetch the series of a single currency for a whole date interval.
+        """
+        params = {
+            "date_req1": start_date.strftime("%d.%m.%Y"),
+            "date_req2": end_date.strftime("%d.%m.%Y"),
+            "VAL_NM_RQ": cbr_id,
+        }
+        return await self._get(self.dynamic_url, params)
+
+    async def _get(self, url: str, params: Dict[str, str]) -> bytes:
+        # Identical requests already in flight (same URL and date_req) share
+        # one upstream call.
+        return await self._in_flight.do(
+            (url, tuple(sorted(params.items()))), partial(self._request, url, params)
+        )
+
+    async def _request(self, url: str, params: Dict[str, str]) -> bytes:
+        async with self.breaker.guard():
+            return await self._hedged(url, params)
+
+    async def _hedged(self, url: str, params: Dict[str, str]) -> bytes:
+        """
+        Start a second identical request once the first has taken `hedge_delay`
+        or failed with an error worth retrying; the first response wins.
+        """
+        pending: Set["asyncio.Task[bytes]"] = {
+            asyncio.create_task(self._attempt(url, params))
+        }
+        hedged = self.hedge_delay is None
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else self.hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    if not is_upstream_failure(error):
+                        raise error
+                if not hedged:
+                    hedged = True
+                    pending.add(asyncio.create_task(self._attempt(url, params)))
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, url: str, params: Dict[str, str]) -> bytes:
+        response = await self._client.get(
+            url, params=params, timeout=self.timeouts[url]
+        )
+        response.raise_for_status()
+        return response.content
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Whether an error means the CBR is failing (a network error, a timeout,
+    a 5xx or a 429) rather than that the request itself was wrong.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, httpx.TransportError)
+
+
+def fill_calendar_days(
+    series: List[Tuple[date, float]],
+    start_date: date,
+    end_date: date,
+    in_effect_until: Optional[Callable[[date], date]] = None,
+) -> Dict[date, float]:
+    """
+    Expand publication-date records to every calendar day of the interval.
+    A day without its own record takes the last published rate, like XML_daily
+    does, but only up to `in_effect_until` of that record's date when given;
+    later days, such as after a currency was delisted, are left out.
+    """
+    published = [(day, rate) for day, rate in series if day <= end_date]
+    if not published or start_date > end_date:
+        return {}
+
+    origin = min(published[0][0], start_date)
+    length = (end_date - origin).days + 1
+    positions = [(day - origin).days for day, _ in published]
+    column = np.full(length, np.nan)
+    column[positions] = [rate for _, rate in published]
+    filled = forward_fill(column)
+    if in_effect_until is not None:
+        # Index of the record each day carries, and the last day it may.
+        records = np.full(length, -1)
+        records[positions] = np.arange(len(published))
+        records = np.maximum.accumulate(records)
+        last_days = np.array(
+            [(in_effect_until(day) - origin).days for day, _ in published]
+        )
+        filled[(records >= 0) & (np.arange(length) > last_days[records])] = np.nan
+    filled = filled[(start_date - origin).days :]
+    offsets = np.flatnonzero(~np.isnan(filled))
+    return {
+        start_date + timedelta(days=offset): rate
+        for offset, rate in zip(offsets.tolist(), filled[offsets].tolist())
+    }
@@ -0,0 +1,152 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+# Parsed daily documents kept by content hash. The same document is typically
+# fetched for the currency list, the latest rates and the snapshot in a row.
+DAILY_CACHE_SIZE = 64
+
+FEED_CHUNK_SIZE = 64 * 1024
+
+_RECORD_FIELDS = frozenset(("Nominal", "Value"))
+
+
+@dataclass(frozen=True)
+class DailyDocument:
+    """
+    Rates of one XML_daily document. Shared between callers; treat as read-only.
+    """
+
+    date: str
+    rates: Mapping[str, float]
+    ids: Mapping[str, str]
+    names: Mapping[str, str]
+    nominals: Mapping[str, int]
+
+
+_daily_cache: "OrderedDict[bytes, DailyDocument]" = OrderedDict()
+
+
+def parse_daily(xml_content: bytes) -> DailyDocument:
+    """
+    Parse an XML_daily document into code -> rate to RUB, code -> CBR id,
+    name and nominal, and the document date, memoized by the hash of the raw bytes.
+    """
+    digest = hashlib.blake2b(xml_content, digest_size=16).digest()
+    document = _daily_cache.get(digest)
+    if document is not None:
+        _daily_cache.move_to_end(digest)
+        return document
+
+    document = _parse_daily(xml_content)
+    _daily_cache[digest] = document
+    if len(_daily_cache) > DAILY_CACHE_SIZE:
+        _daily_cache.popitem(last=False)
+    return document
+
+
+def parse_dynamic(xml_content: bytes) -> List[Tuple[date, float]]:
+    """
+    Parse an XML_dynamic document into sorted (publication date, rate to RUB) pairs.
+    """
+    series = []
+    fields: Dict[str, Optional[str]] = {}
+    for _, element in _end_events(xml_content):
+        tag = element.tag
+        if tag in _RECORD_FIELDS:
+            fields[tag] = element.text
+        elif tag == "Record":
+            record_date = _to_date(element.get("Date"))
+            rate = _to_rate(fields.get("Value"), fields.get("Nominal"))
+            if record_date is not None and rate is not None:
+                series.append((record_date, rate))
+            fields.clear()
+            element.clear()
+
+    series.sort()
+    return series
+
+
+def _parse_daily(xml_content: bytes) -> DailyDocument:
+    rates: Dict[str, float] = {}
+    ids: Dict[str, str] = {}
+    names: Dict[str, str] = {}
+    nominals: Dict[str, int] = {}
+
+    # A daily document is a few kilobytes, so building it as a tree in C and
+    # walking the children directly beats pulling events through Python.
+    root = ET.fromstring(xml_content)
+    for valute in root.iter("Valute"):
+        char_code = name = nominal = value = None
+        for child in valute:
+            tag = child.tag
+            if tag == "CharCode":
+                char_code = child.text
+            elif tag == "Value":
+                value = child.text
+            elif tag == "Nominal":
+                nominal = child.text
+            elif tag == "Name":
+                name = child.text
+        if not char_code:
+            continue
+        cbr_id = valute.get("ID")
+        if cbr_id:
+            ids[char_code] = cbr_id
+        names[char_code] = (name or char_code).strip()
+        nominals[char_code] = _to_nominal(nominal)
+        rate = _to_rate(value, nominal)
+        if rate is not None:
+            rates[char_code] = rate
+
+    return DailyDocument(
+        date=root.get("Date", ""),
+        rates=rates,
+        ids=ids,
+        names=names,
+        nominals=nominals,
+    )
+
+
+def _end_events(xml_content: bytes) -> Iterator[Tuple[Any, ...]]:
+    """
+    Pull end events from the raw bytes. The declared windows-1251 encoding is
+    decoded by the XML parser itself, so the document is never decoded up front.
+    """
+    parser: ET.XMLPullParser[Any] = ET.XMLPullParser(events=("end",))
+    for offset in range(0, len(xml_content), FEED_CHUNK_SIZE):
+        parser.feed(xml_content[offset : offset + FEED_CHUNK_SIZE])
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def _to_date(value: Optional[str]) -> Optional[date]:
+    """
+    Parse a dd.mm.yyyy date without the overhead of strptime.
+    """
+    if value is None or len(value) != 10:
+        return None
+    try:
+        return date(int(value[6:]), int(value[3:5]), int(value[:2]))
+    except ValueError:
+        return None
+
+
+def _to_nominal(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 1
+    except ValueError:
+        return 1
+
+
+def _to_rate(value: Optional[str], nominal: Optional[str]) -> Optional[float]:
+    if value is None or nominal is None:
+        return None
+    try:
+        return float(value.replace(",", ".")) / float(nominal)
+    except (ValueError, ZeroDivisionError):
+        return None
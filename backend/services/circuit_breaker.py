@@ -0,0 +1,112 @@
+import asyncio
+import random
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from loguru import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream that is known to be failing.
+    """
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed, calls go through until `failure_threshold` of them fail in a row.
+    Open, calls fail fast with CircuitOpenError for the reset timeout.
+    Half-open, a single trial call goes through: success closes the circuit,
+    failure opens it again for twice as long, up to `max_reset_timeout`.
+    Open periods are jittered so that workers do not probe in lockstep.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        max_reset_timeout: float = 300.0,
+        is_failure: Callable[[BaseException], bool] = lambda error: True,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.is_failure = is_failure
+        self._failures = 0
+        self._backoff = reset_timeout
+        # Monotonic time the circuit stays open until; None while closed
+        self._open_until: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._open_until is None:
+            return CLOSED
+        if time.monotonic() < self._open_until:
+            return OPEN
+        return HALF_OPEN
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """
+        Wrap one upstream call: fail fast while open and record its outcome.
+        """
+        self._acquire()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self._probing = False
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._record_failure()
+            else:
+                self._record_success()
+            raise
+        else:
+            self._record_success()
+
+    def _acquire(self) -> None:
+        state = self.state
+        if state == OPEN:
+            assert self._open_until is not None
+            raise CircuitOpenError(self.name, self._open_until - time.monotonic())
+        if state == HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probing = True
+
+    def _record_success(self) -> None:
+        if self._open_until is not None:
+            logger.info(f"{self.name} recovered, closing the circuit")
+        self._failures = 0
+        self._backoff = self.reset_timeout
+        self._open_until = None
+        self._probing = False
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._probing:
+            self._probing = False
+            self._backoff = min(self.max_reset_timeout, self._backoff * 2)
+        elif self._open_until is not None or self._failures < self.failure_threshold:
+            return
+        # Equal jitter: at least half the backoff, at most all of it.
+        delay = self._backoff / 2 + random.uniform(0, self._backoff / 2)
+        self._open_until = time.monotonic() + delay
+        logger.warning(
+            f"{self.name} failed {self._failures} times in a row, "
+            f"opening the circuit for {delay:.1f}s"
+        )
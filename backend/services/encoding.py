@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import msgspec
+import numpy as np
+
+from models import HistoricalBatch, HistoricalRate, HistoricalSeries, RateCandle
+from services.rate_matrix import DayArray, FloatArray
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow IPC is optional: install the `arrow` extra
+    pa = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.currency-tracker.columnar+json"
+MSGPACK = "application/msgpack"
+X_MSGPACK = "application/x-msgpack"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+CANDLE_SERIES = ("open", "high", "low", "close")
+
+
+@dataclass(frozen=True)
+class RateColumns:
+    """
+    Rate series on one shared date axis, NaN where a rate is unknown.
+    `meta` holds the request parameters echoed back to the client.
+    """
+
+    meta: Dict[str, str]
+    dates: DayArray
+    series: Dict[str, FloatArray]
+    # Whether every rate up to today was known when the columns were built
+    complete: bool = True
+
+    def date_strings(self) -> List[str]:
+        dates: List[str] = np.datetime_as_string(self.dates, unit="D").tolist()
+        return dates
+
+    def values(self, name: str) -> List[Optional[float]]:
+        return nullable(self.series[name])
+
+
+def media_types() -> List[str]:
+    """
+    Media types the rate endpoints can produce, in order of preference.
+    """
+    types = [JSON, COLUMNAR_JSON, MSGPACK, X_MSGPACK]
+    if pa is not None:
+        types.append(ARROW_STREAM)
+    return types
+
+
+def encode(columns: RateColumns, media_type: str) -> bytes:
+    """
+    Encode columns as columnar JSON, msgpack or an Arrow IPC stream.
+    """
+    if media_type == ARROW_STREAM:
+        return _encode_arrow(columns)
+
+    # msgspec writes dates as ISO strings itself, much faster than numpy does.
+    document: Dict[str, Any] = {
+        **columns.meta,
+        "dates": columns.dates.astype(object).tolist(),
+        "series": {name: columns.values(name) for name in columns.series},
+    }
+    if media_type in (MSGPACK, X_MSGPACK):
+        return msgspec.msgpack.encode(document)
+    return msgspec.json.encode(document)
+
+
+def nullable(values: FloatArray) -> List[Optional[float]]:
+    """
+    Convert an array to a list with None in place of NaN.
+    """
+    unknown = np.isnan(values)
+    if not unknown.any():
+        known: List[Optional[float]] = values.tolist()
+        return known
+    boxed = values.astype(object)
+    boxed[unknown] = None
+    converted: List[Optional[float]] = boxed.tolist()
+    return converted
+
+
+def to_historical_rates(columns: RateColumns) -> List[HistoricalRate]:
+    return [
+        HistoricalRate(date=day, rate=rate)
+        for day, rate in zip(columns.date_strings(), columns.series["rate"].tolist())
+    ]
+
+
+def to_historical_series(columns: RateColumns) -> HistoricalSeries:
+    meta = columns.meta
+    history = HistoricalSeries(
+        currency=meta["currency"],
+        base=meta["base"],
+        start=meta["start"],
+        end=meta["end"],
+        resolution=meta["resolution"],
+        rates=to_historical_rates(columns),
+    )
+    if "open" in columns.series:
+        history.candles = [
+            RateCandle(date=day, open=open, high=high, low=low, close=close)
+            for day, open, high, low, close in zip(
+                columns.date_strings(),
+                *(columns.series[name].tolist() for name in CANDLE_SERIES),
+            )
+        ]
+    return history
+
+
+def to_historical_batch(columns: RateColumns) -> HistoricalBatch:
+    return HistoricalBatch(
+        start=columns.meta["start"],
+        end=columns.meta["end"],
+        dates=columns.date_strings(),
+        series={name: columns.values(name) for name in columns.series},
+    )
+
+
+def _encode_arrow(columns: RateColumns) -> bytes:
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+    # from_pandas=True turns NaN into Arrow nulls.
+    table = pa.table(
+        {
+            "date": pa.array(columns.dates),
+            **{
+                name: pa.array(values, from_pandas=True)
+                for name, values in columns.series.items()
+            },
+        },
+        metadata=columns.meta,
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    encoded: bytes = sink.getvalue().to_pybytes()
+    return encoded
@@ -1,475 +1,1032 @@
-import httpx
-from xml.etree import ElementTree as ET
 from typing import Optional, Dict
 from datetime import date, timedelta
 from models.currency import ExchangeRates
-import redis
 from config import Config
-import json
-from typing import Dict
-from repositories.rates_repository import RatesRepository
-from typing import List
-from models import HistoricalRate
+from repositories.rate_archive import RateArchive
+from repositories.rates_repository import RatesRepository, expand_date_intervals
+from services.cache import RatesCache
+from services.catalogue import CurrencyCatalogue, catalogue_entries
+from services.cbr_client import CbrClient, fill_calendar_days, is_upstream_failure
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.cbr_parser import DailyDocument, parse_daily, parse_dynamic
+from services.encoding import RateColumns
+from services.jobs import JobContext
+from services.preload import PreloadScheduler, Progress, TokenBucket
+from services.publication import PublicationSchedule, parse_document_date
+from services.rate_updates import PUBLICATIONS_CHANNEL, RateUpdates
+from services.rate_matrix import (
+    FloatArray,
+    RateMatrix,
+    cross_rates,
+    forward_fill,
+    lttb,
+    resample_ohlc_arrays,
+)
+from typing import List, Set, Tuple
+from functools import partial
+from models import Currency, RateSnapshot
 import asyncio
+import calendar
+import hashlib
 import logging
+import numpy as np
 from loguru import logger
 
+SERIES_LOOKBACK_DAYS = 14
+# Slack over the publication calendar before a series record stops being
+# carried forward, for days off set by decree that are not configured.
+SERIES_CARRY_DAYS = 3
+
+RESOLUTIONS = ("daily", "weekly", "monthly", "lttb")
+# How days not loaded yet are returned: left out (null in columns) or forward-filled
+FILLS = ("none", "forward")
+DEFAULT_LTTB_POINTS = 500
+MAX_BATCH_PAIRS = 50
+# The CBR has no rates before its first official rouble rate; ranges may
+# reach at most a year past today.
+FIRST_RATE_DATE = date(1992, 7, 1)
+MAX_FUTURE_DAYS = 366
+
+PRELOAD_JOB = "preload"
+ARCHIVE_JOB = "archive"
+
+# Served while neither the database nor the CBR can provide the catalogue
+FALLBACK_CATALOGUE = CurrencyCatalogue.build(
+    Currency(code=code, name=code, nominal=1)
+    for code in ("USD", "EUR", "GBP", "JPY", "CNY", "CHF", "CAD", "AUD", "KRW")
+)
+
 
 class ExchangesService:
     def __init__(
-        self, config: Config, redis_client: Optional[redis.Redis] = None
+        self,
+        config: Config,
+        cache: Optional[RatesCache] = None,
+        cbr_client: Optional[CbrClient] = None,
     ) -> None:
-        self._base_url = "http://www.cbr.ru/scripts/XML_daily.asp"
         self.config = config
-        self.redis_client = redis_client or self._create_redis_client()
-        self.repository = RatesRepository()
+        self.cbr_client = cbr_client or CbrClient(
+            config.cbr_base_url,
+            timeout=config.http_timeout,
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections,
+            daily_timeout=config.cbr_daily_timeout,
+            dynamic_timeout=config.cbr_dynamic_timeout,
+            hedge_delay=config.cbr_hedge_delay or None,
+            breaker=CircuitBreaker(
+                "CBR",
+                failure_threshold=config.cbr_breaker_threshold,
+                reset_timeout=config.cbr_breaker_reset_timeout,
+                max_reset_timeout=config.cbr_breaker_max_reset_timeout,
+                is_failure=is_upstream_failure,
+            ),
+        )
+        self.cache = cache or RatesCache.from_config(config)
+        self.repository = RatesRepository(
+            db_path=config.database_path,
+            read_workers=config.database_read_workers,
+            batch_size=config.database_batch_size,
+        )
+        self.archive = (
+            RateArchive(config.archive_path) if config.archive_enabled else None
+        )
+        # Shared by every preload so that concurrent runs stay polite together.
+        self.rate_limiter = TokenBucket(config.cbr_requests_per_second)
+        self.publications = PublicationSchedule(
+            config.cbr_publication_time,
+            holidays=config.cbr_holidays,
+            working_days=config.cbr_working_days,
+        )
+        self.updates = RateUpdates()
+        # The latest CBR document seen, and its date once parsed
+        self._latest_digest: Optional[bytes] = None
+        self.latest_document_date: Optional[date] = None
+        # Loaded from the database on first use, dropped on new publications
+        self._catalogue: Optional[CurrencyCatalogue] = None
+        # Background fetches of missing history, by range and by interval
+        self._backfills: Dict[
+            Tuple[Tuple[str, ...], date, date], "asyncio.Task[None]"
+        ] = {}
+        self._backfilling: Set[Tuple[str, date, date]] = set()
+        # Codes the latest publication was checked for and does not list
+        self._unlisted: Set[str] = set()
 
         # Disable httpx info logging
         logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    def _create_redis_client(self) -> redis.Redis:
-        return redis.Redis(
-            host=self.config.redis_host,
-            port=self.config.redis_port,
-            db=self.config.redis_db,
-            decode_responses=True,
-            socket_timeout=5,
+    async def close(self) -> None:
+        """
+        Stop backfills and release the upstream HTTP, Redis and database connections.
+        """
+        backfills = list(self._backfills.values())
+        for task in backfills:
+            task.cancel()
+        await asyncio.gather(*backfills, return_exceptions=True)
+        # The database threads finish their queries first, off the event loop.
+        await asyncio.gather(
+            self.cbr_client.aclose(),
+            self.cache.close(),
+            asyncio.to_thread(self.repository.close),
         )
 
-    async def get_historical_rates(
+    async def get_recent_rate_series(
         self, currency: str, base_currency: str, days: int = 30
-    ) -> List[HistoricalRate]:
+    ) -> RateColumns:
         """
-        Get historical exchange rates with database caching.
+        Columnar daily rates of the last `days` days, as far as they are stored.
         """
-        cache_key = f"historical:{currency}:{base_currency}:{days}"
-
-        if self.redis_client:
-            try:
-                cached_data = await self.redis_client.get(cache_key)
-                if cached_data:
-                    return [HistoricalRate(**item) for item in json.loads(cached_data)]
-            except redis.RedisError:
-                pass
-
-        db_rates = self.repository.get_rates(currency, base_currency, days)
-        if db_rates:
-            if self.redis_client:
-                try:
-                    self.redis_client.setex(
-                        cache_key,
-                        3600,
-                        json.dumps(
-                            [{"date": r.date, "rate": r.rate} for r in db_rates]
-                        ),
-                    )
-                except redis.RedisError:
-                    pass
-            return db_rates
-
-        start_date = date.today() - timedelta(days=days - 1)
         end_date = date.today()
-        missing_dates = self.repository.get_missing_dates_for_range(
-            currency, base_currency, start_date, end_date
+        max_days = (end_date - FIRST_RATE_DATE).days + 1
+        if days > max_days:
+            raise ValueError(f"days must be at most {max_days}")
+        return await self.get_rate_series(
+            currency, base_currency, end_date - timedelta(days=days - 1), end_date
         )
-        logger.info(
-            f"Found {len(missing_dates)} missing rates for {currency}/{base_currency} in the last {days} days"
+
+    async def get_rate_series(
+        self,
+        currency: str,
+        base_currency: str,
+        start_date: date,
+        end_date: date,
+        resolution: str = "daily",
+        points: int = DEFAULT_LTTB_POINTS,
+        fill: str = "none",
+    ) -> RateColumns:
+        """
+        Get the rates of a pair over a date range at the requested resolution:
+        every day, weekly or monthly OHLC candles, or `points` LTTB-picked days.
+        Columns are a "rate" series, plus "open", "high", "low" and "close"
+        for candles ("rate" is then the close). Days not loaded yet are left
+        out, or carry the previous rate with `fill="forward"`, while they are
+        fetched in the background; `complete` is False until then. Days the
+        CBR has no rate for, such as before a currency was listed, stay empty
+        and do not make the series incomplete.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(
+                f"Unknown resolution {resolution}, expected one of {', '.join(RESOLUTIONS)}"
+            )
+        _check_range(start_date, end_date)
+
+        matrix, complete = await self._load_available_matrix(
+            [currency, base_currency], start_date, end_date, fill
         )
-        rates_to_save = []
-        consecutive_failures = 0
+        series = matrix.pair_series(currency, base_currency)
+        meta = {
+            "currency": currency,
+            "base": base_currency,
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat(),
+            "resolution": resolution,
+        }
+        if resolution in ("weekly", "monthly"):
+            days, open, high, low, close = resample_ohlc_arrays(
+                start_date, series, resolution
+            )
+            return RateColumns(
+                meta=meta,
+                dates=days,
+                series={
+                    "rate": close,
+                    "open": open,
+                    "high": high,
+                    "low": low,
+                    "close": close,
+                },
+                complete=complete,
+            )
 
-        if missing_dates:
-            pass
+        if resolution == "lttb":
+            picked = lttb(series, points)
+        else:
+            picked = np.flatnonzero(~np.isnan(series))
+        return RateColumns(
+            meta=meta,
+            dates=np.datetime64(start_date, "D") + picked,
+            series={"rate": series[picked]},
+            complete=complete,
+        )
 
-        for missing_date in missing_dates:
-            logger.info(
-                f"Loading historical rate for {currency}/{base_currency} on {missing_date}"
+    async def get_rate_series_batch(
+        self,
+        pairs: List[Tuple[str, str]],
+        start_date: date,
+        end_date: date,
+        fill: str = "none",
+    ) -> RateColumns:
+        """
+        Get daily rates of many pairs over one date range on a shared date axis,
+        one "CUR/BASE" series per pair. All pairs are computed from a single
+        rate matrix of their currencies.
+        """
+        if not pairs:
+            raise ValueError("At least one pair is required")
+        if len(pairs) > MAX_BATCH_PAIRS:
+            raise ValueError(
+                f"At most {MAX_BATCH_PAIRS} pairs can be requested at once"
             )
-            try:
-                if base_currency == "RUB":
-                    rate = await self.get_currency_exchange_rate(currency, missing_date)
-                    historical_rate = HistoricalRate(
-                        date=missing_date.isoformat(), rate=rate
-                    )
-                else:
-                    currency_to_rub = await self.get_currency_exchange_rate(
-                        currency, missing_date
-                    )
-                    base_to_rub = await self.get_currency_exchange_rate(
-                        base_currency, missing_date
-                    )
-                    cross_rate = currency_to_rub / base_to_rub
-                    historical_rate = HistoricalRate(
-                        date=missing_date.isoformat(), rate=cross_rate
-                    )
+        _check_range(start_date, end_date)
 
-                rates_to_save.append(historical_rate)
-                consecutive_failures = 0
-                logger.info(
-                    f"Successfully loaded rate for {currency}/{base_currency} on {missing_date}: {historical_rate.rate}"
+        matrix, complete = await self._load_available_matrix(
+            [code for pair in pairs for code in pair], start_date, end_date, fill
+        )
+        return RateColumns(
+            meta={"start": start_date.isoformat(), "end": end_date.isoformat()},
+            dates=np.datetime64(start_date, "D") + np.arange(len(matrix.values)),
+            series={
+                f"{currency}/{base_currency}": matrix.pair_series(
+                    currency, base_currency
                 )
+                for currency, base_currency in pairs
+            },
+            complete=complete,
+        )
 
-            except Exception as e:
-                consecutive_failures += 1
-                logger.error(
-                    f"Failed to fetch rate for {missing_date} in pair {currency}/{base_currency}: {e}"
-                )
-                if consecutive_failures >= 3:
-                    await asyncio.sleep(5 * 60)
-                    consecutive_failures = 0
-                continue
+    async def _load_available_matrix(
+        self,
+        currencies: List[str],
+        start_date: date,
+        end_date: date,
+        fill: str = "none",
+    ) -> Tuple[RateMatrix, bool]:
+        """
+        Load a rate matrix from what is stored, scheduling a background fetch
+        of whatever is missing up to today rather than waiting for it.
+        Returns the matrix and whether nothing is left to fetch.
+        """
+        if fill not in FILLS:
+            raise ValueError(f"Unknown fill {fill}, expected one of {', '.join(FILLS)}")
+        await self._check_currencies(currencies)
+        matrix = await self._load_rate_matrix(currencies, start_date, end_date)
+        available_until = min(end_date, date.today())
+        if start_date > available_until or matrix.is_complete(available_until):
+            return matrix, True
+
+        # Some of the empty days may be ones the CBR has no rate for.
+        complete = not await self.repository.get_missing_intervals(
+            currencies, start_date, available_until
+        )
+        if not complete:
+            self._schedule_backfill(currencies, start_date, available_until)
+        if fill == "forward":
+            matrix = RateMatrix(
+                start_date, matrix.currencies, forward_fill(matrix.values)
+            )
+        return matrix, complete
+
+    async def _check_currencies(self, currencies: List[str]) -> None:
+        """
+        Reject codes that are neither listed by the CBR nor stored.
+        """
+        catalogue = await self.get_currency_catalogue()
+        if catalogue is FALLBACK_CATALOGUE:
+            # Nothing to check against while the CBR and the database are empty.
+            return
+        unknown = {code.upper() for code in currencies} - set(catalogue.codes)
+        if unknown:
+            unknown -= set(await self.repository.get_currency_ids())
+        if unknown:
+            raise ValueError(f"Unknown currency {', '.join(sorted(unknown))}")
 
-        if rates_to_save:
+    def _schedule_backfill(
+        self, currencies: List[str], start_date: date, end_date: date
+    ) -> None:
+        key = (
+            tuple(sorted({code.upper() for code in currencies})),
+            start_date,
+            end_date,
+        )
+        if key in self._backfills:
+            return
+        task = asyncio.create_task(self._backfill(list(key[0]), start_date, end_date))
+        self._backfills[key] = task
+        task.add_done_callback(lambda _: self._backfills.pop(key, None))
+
+    async def _backfill(
+        self, currencies: List[str], start_date: date, end_date: date
+    ) -> None:
+        """
+        Fetch the missing RUB series of the currencies under the preload rate
+        limit and retry policy. Intervals another backfill is already
+        fetching are skipped.
+        """
+        try:
+            gaps = await self._carry_over_gaps(
+                await self.repository.get_missing_intervals(
+                    currencies, start_date, end_date
+                ),
+                start_date,
+                end_date,
+            )
+            scheduler = self._preload_scheduler()
+            submitted = []
+            for code, intervals in gaps.items():
+                for interval_start, interval_end in intervals:
+                    interval = (code, interval_start, interval_end)
+                    if interval in self._backfilling:
+                        continue
+                    self._backfilling.add(interval)
+                    submitted.append(interval)
+                    scheduler.submit(
+                        ("series", *interval),
+                        partial(self._fetch_rub_series, *interval),
+                    )
+            if not submitted:
+                return
+            logger.info(
+                f"Backfilling {len(submitted)} missing intervals for {'/'.join(currencies)} from {start_date} to {end_date}"
+            )
             try:
-                self.repository.save_rates(currency, base_currency, rates_to_save)
-            except Exception as e:
+                summary = await scheduler.run()
+            finally:
+                self._backfilling.difference_update(submitted)
+            if summary.failed:
                 logger.error(
-                    f"Failed to save rates for {currency}/{base_currency}: {e}"
+                    f"Failed to backfill {len(summary.failed)} intervals for {'/'.join(currencies)}"
                 )
+        except Exception as e:
+            logger.error(f"Backfill of {'/'.join(currencies)} failed: {e}")
 
-        final_rates = self.repository.get_rates(currency, base_currency, days)
-        if final_rates:
-            if self.redis_client:
-                try:
-                    self.redis_client.setex(
-                        cache_key,
-                        3600,
-                        json.dumps(
-                            [{"date": r.date, "rate": r.rate} for r in final_rates]
-                        ),
-                    )
-                except redis.RedisError:
-                    pass
-            return final_rates
+    async def _load_rate_matrix(
+        self, currencies: List[str], start_date: date, end_date: date
+    ) -> RateMatrix:
+        """
+        Assemble a rate matrix from yearly per-currency blocks of RUB rates.
+        Blocks are cached, so every overlapping range and every pair sharing a
+        currency reuses them instead of caching its own window.
+        """
+        codes = list(dict.fromkeys(code.upper() for code in currencies))
+        stored = [code for code in codes if code != "RUB"]
+        years = range(start_date.year, end_date.year + 1)
+        # Archived blocks are views of the memory-mapped archive, so they
+        # bypass the cache.
+        blocks: Dict[Tuple[str, int], FloatArray] = {}
+        for year in years:
+            segment = self.archive.segment(year) if self.archive else None
+            if segment is None:
+                continue
+            for code in stored:
+                archived = segment.column(code, segment.start_date, segment.end_date)
+                if archived is not None:
+                    blocks[(code, year)] = archived
+        keys = {
+            (code, year): f"series:{code}:{year}"
+            for code in stored
+            for year in years
+            if (code, year) not in blocks
+        }
+        cached = await self.cache.get_arrays(list(keys.values()))
+        for block_id, key in keys.items():
+            value = cached[key]
+            if value is not None:
+                blocks[block_id] = value
 
-        return []
+        missing = [block_id for block_id in keys if block_id not in blocks]
+        if missing:
+            first_year = min(year for _, year in missing)
+            last_year = max(year for _, year in missing)
+            loaded = await self.get_rate_matrix(
+                sorted({code for code, _ in missing}),
+                date(first_year, 1, 1),
+                date(last_year, 12, 31),
+            )
+            today = date.today()
+            current: Dict[str, FloatArray] = {}
+            past: Dict[str, FloatArray] = {}
+            for code, year in missing:
+                offset = (date(year, 1, 1) - loaded.start_date).days
+                block = loaded.column(code)[offset : offset + _year_length(year)]
+                blocks[(code, year)] = block
+                # Blocks with gaps are not cached: they get filled later. A past
+                # year never changes, the current one changes with every publication.
+                if (
+                    year > today.year
+                    or np.isnan(block[: (today - date(year, 1, 1)).days + 1]).any()
+                ):
+                    continue
+                target = current if year == today.year else past
+                target[keys[(code, year)]] = block
+            await self.cache.set_arrays(current)
+            await self.cache.set_arrays(past, ttl=self.config.cache_immutable_ttl)
+
+        values = np.full(((end_date - start_date).days + 1, len(codes)), np.nan)
+        for column, code in enumerate(codes):
+            if code == "RUB":
+                values[:, column] = 1.0
+                continue
+            series = np.concatenate([blocks[(code, year)] for year in years])
+            offset = (start_date - date(start_date.year, 1, 1)).days
+            values[:, column] = series[offset : offset + len(values)]
+        return RateMatrix(start_date, codes, values)
 
-    async def update_daily_rates(self) -> None:
+    async def get_rate_matrix(
+        self, currencies: List[str], start_date: date, end_date: date
+    ) -> RateMatrix:
         """
-        Update database with today's rates for all available currencies.
+        Load the stored RUB rates of several currencies as a dates x currencies matrix.
+        Archived years are copied from the archive; only the rest is queried.
         """
-        try:
-            exchange_rates = await self.get_all_currency_exchange_rates("RUB")
-            today = date.today()
+        matrix = RateMatrix.from_rows(start_date, end_date, currencies, [])
+        # (currencies, first day, last day) left to read from the database
+        queries: List[Tuple[List[str], date, date]] = []
+        for year in range(start_date.year, end_date.year + 1):
+            first = max(start_date, date(year, 1, 1))
+            last = min(end_date, date(year, 12, 31))
+            offset = (first - start_date).days
+            segment = self.archive.segment(year) if self.archive else None
+            rest = []
+            for column, code in enumerate(matrix.currencies):
+                if code == "RUB":
+                    continue
+                archived = segment.column(code, first, last) if segment else None
+                if archived is None:
+                    rest.append(code)
+                else:
+                    matrix.values[offset : offset + len(archived), column] = archived
+            if not rest:
+                continue
+            if (
+                queries
+                and queries[-1][0] == rest
+                and queries[-1][2] == first - timedelta(days=1)
+            ):
+                queries[-1] = (rest, queries[-1][1], last)
+            else:
+                queries.append((rest, first, last))
 
-            for currency, rate in exchange_rates.rates.items():
-                if currency != "RUB":
-                    historical_rate = HistoricalRate(date=today.isoformat(), rate=rate)
-                    self.repository.save_single_rate(currency, "RUB", historical_rate)
+        for rest, first, last in queries:
+            rows = await self.repository.get_rate_matrix_rows(rest, first, last)
+            loaded = RateMatrix.from_rows(first, last, rest, rows)
+            offset = (first - start_date).days
+            for code in rest:
+                matrix.values[
+                    offset : offset + len(loaded.values), matrix.currencies.index(code)
+                ] = loaded.column(code)
+        return matrix
 
-        except Exception as e:
-            logger.error(f"Failed to update daily rates: {e}")
+    async def update_daily_rates(self) -> bool:
+        """
+        Ingest the latest CBR publication if it changed since the last check.
+        Returns whether it did, in which case the caches derived from it are
+        rebuilt and subscribers in every worker are notified. Upstream
+        failures, including CircuitOpenError, are raised to the caller.
+        """
+        xml_content = await self.cbr_client.fetch_daily()
+        digest = hashlib.blake2b(xml_content, digest_size=16).digest()
+        if digest == self._latest_digest:
+            return False
+
+        document = parse_daily(xml_content)
+        effective_date = parse_document_date(document.date)
+        if effective_date is None:
+            raise ValueError(f"Unexpected document date {document.date!r}")
+        await self._refresh_catalogue(document)
+        snapshot = RateSnapshot(
+            date=effective_date.isoformat(),
+            document_date=document.date,
+            rates=self._extract_rates_to_rub(document),
+        )
+        existing = await self.repository.get_snapshot(effective_date)
+        if (
+            existing is not None
+            and existing.document_date == snapshot.document_date
+            and existing.rates == snapshot.rates
+        ):
+            self._remember_latest(digest, effective_date)
+            return False
+
+        await self._carry_forward_snapshot(effective_date)
+        await self.repository.save_snapshot(snapshot)
+
+        # Everything derived from the latest publication is now outdated,
+        # in this worker and in every other one.
+        day = effective_date.isoformat()
+        await self.cache.invalidate(
+            [
+                "rates_all:*:latest",
+                f"rates_all:*:{day}",
+                f"series:*:{effective_date.year}",
+            ]
+        )
+        # Only now is the publication ingested; until then every poll retries it.
+        self._remember_latest(digest, effective_date)
+        await self._warm_caches(snapshot, effective_date)
+        await self.announce_publication(document.date)
+        logger.info(f"New CBR publication for {document.date}")
+        return True
+
+    def _remember_latest(self, digest: bytes, document_date: date) -> None:
+        self._latest_digest = digest
+        self.latest_document_date = document_date
+
+    async def _carry_forward_snapshot(self, effective_date: date) -> None:
+        """
+        Store the previous document's rates for the days it stays in effect
+        up to `effective_date` (weekends), unless a publication was missed
+        in between; such gaps are left to the series fetch.
+        """
+        previous_date = await self.repository.get_latest_snapshot_date(effective_date)
+        if previous_date is None or (effective_date - previous_date).days < 2:
+            return
+        previous = await self.repository.get_snapshot(previous_date)
+        document_date = (
+            parse_document_date(previous.document_date) if previous else None
+        )
+        if previous is None or document_date is None:
+            return
+        if (
+            self.publications.next_after(document_date).date()
+            != self.publications.published_at(effective_date).date()
+        ):
+            return
+        await self.repository.save_snapshot(
+            previous,
+            [
+                previous_date + timedelta(days=offset)
+                for offset in range(1, (effective_date - previous_date).days)
+            ],
+        )
+
+    async def _warm_caches(self, snapshot: RateSnapshot, effective_date: date) -> None:
+        """
+        Fill the caches of a new publication before anyone asks: the rate
+        tables of the common bases and this year's series blocks.
+        """
+        for base_currency in self.config.warm_bases:
+            if base_currency not in snapshot.rates:
+                continue
+            exchange_rates = self._build_exchange_rates(
+                snapshot.rates, base_currency, snapshot.document_date
+            )
+            for day in (None, effective_date):
+                await self.cache.set_exchange_rates(
+                    _rates_key(base_currency, day), exchange_rates
+                )
+        await self._load_rate_matrix(
+            list(snapshot.rates), date(effective_date.year, 1, 1), effective_date
+        )
+
+    async def announce_publication(self, document_date: str) -> None:
+        """
+        Notify rate subscribers of every worker about a new publication.
+        """
+        # Without Redis (or anyone listening) this worker is on its own.
+        if not await self.cache.publish(PUBLICATIONS_CHANNEL, document_date):
+            self.updates.notify(document_date)
+
+    async def listen_for_updates(self) -> None:
+        """
+        Apply cache invalidations and relay publications announced by any
+        worker to local subscribers, until cancelled.
+        """
+        await self.cache.listen({PUBLICATIONS_CHANNEL: self._on_publication})
+
+    def _on_publication(self, document_date: str) -> None:
+        # The worker that ingested the publication may have changed the catalogue.
+        self._catalogue = None
+        self._unlisted.clear()
+        self.updates.notify(document_date)
 
     async def get_all_available_currencies(self) -> List[str]:
         """
-        Get list of all available currency codes from CBR.
+        Get list of all available currency codes.
+        """
+        return list((await self.get_currency_catalogue()).codes)
+
+    async def get_currency_catalogue(self) -> CurrencyCatalogue:
+        """
+        The currencies of the latest CBR publication, kept in memory and in
+        the database; only an empty database makes it fetch the CBR.
         """
+        if self._catalogue is not None:
+            return self._catalogue
+        currencies = await self.repository.get_catalogue()
+        if currencies:
+            self._catalogue = CurrencyCatalogue.build(currencies)
+            return self._catalogue
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(self._base_url)
-                response.raise_for_status()
-                root = ET.fromstring(response.content)
-
-                currencies = []
-                for valute in root.findall("Valute"):
-                    char_code = valute.findtext("CharCode")
-                    if char_code:
-                        currencies.append(char_code)
-
-                currencies.append("RUB")
-                return sorted(list(set(currencies)))
+            document = parse_daily(await self.cbr_client.fetch_daily())
         except Exception as e:
             logger.warning(
                 f"Failed to fetch available currencies from CBR API: {e}. Using fallback list."
             )
-            return [
-                "USD",
-                "EUR",
-                "GBP",
-                "JPY",
-                "CNY",
-                "CHF",
-                "CAD",
-                "AUD",
-                "KRW",
-                "RUB",
-            ]
+            return FALLBACK_CATALOGUE
+        await self._refresh_catalogue(document)
+        return self._catalogue or FALLBACK_CATALOGUE
 
-    async def preload_historical_data(self, days: int = 180) -> None:
+    async def _refresh_catalogue(self, document: DailyDocument) -> None:
         """
-        Preload historical data for all available currencies.
-        Optimized to minimize API calls by first checking database for existing records.
+        Store the currencies of the latest publication if they changed.
         """
-        try:
-            all_currencies = await self.get_all_available_currencies()
-
-            for base_currency in ["RUB", "USD", "EUR"]:
-                for currency in all_currencies:
-                    if currency == base_currency:
-                        continue
-
-                    try:
-                        start_date = date.today() - timedelta(days=days - 1)
-                        end_date = date.today()
-                        missing_dates = self.repository.get_missing_dates_for_range(
-                            currency, base_currency, start_date, end_date
-                        )
-
-                        if not missing_dates:
-                            continue
-
-                        logger.info(
-                            f"Preloading {len(missing_dates)} missing rates for {currency}/{base_currency}"
-                        )
-                        chunk_size = 10
-                        for i in range(0, len(missing_dates), chunk_size):
-                            chunk = missing_dates[i : i + chunk_size]
-                            await self._load_historical_chunk(
-                                currency, base_currency, chunk
-                            )
-
-                            await asyncio.sleep(0.5)
-
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to preload data for {currency}/{base_currency}: {e}"
-                        )
-                        continue
-
-        except Exception as e:
-            raise e
+        currencies = catalogue_entries(document)
+        current = self._catalogue or CurrencyCatalogue.build(
+            await self.repository.get_catalogue()
+        )
+        catalogue = CurrencyCatalogue.build(currencies)
+        if catalogue.currencies != current.currencies:
+            await self.repository.save_catalogue(currencies)
+            logger.info(f"Currency catalogue updated: {len(currencies)} currencies")
+        self._catalogue = catalogue
 
-    async def _load_historical_chunk(
-        self, currency: str, base_currency: str, dates: List[date]
+    async def preload_historical_data(
+        self,
+        days: int = 180,
+        end_date: Optional[date] = None,
+        job: Optional[JobContext] = None,
     ) -> None:
         """
-        Load historical data for a chunk of dates.
-        Optimized to handle errors gracefully and provide detailed logging.
+        Preload historical data for all available currencies.
+        Optimized to minimize API calls by first checking database for existing records.
+        Progress and a checkpoint to resume from are reported to `job`.
         """
-        rates_to_save = []
-        failed_dates = []
-        consecutive_failures = 0
+        try:
+            all_currencies = await self.get_all_available_currencies()
+            end_date = end_date or date.today()
+            start_date = end_date - timedelta(days=days - 1)
+            # Work done by the interrupted runs this one resumes; what they
+            # stored is no longer missing, so the plan below skips it.
+            done = int(job.checkpoint.get("done", 0)) if job else 0
 
-        for target_date in dates:
-            existing_rate = self.repository.get_rate_by_date(
-                currency, base_currency, target_date
+            # Only RUB-anchored values are stored and every other base is
+            # derived at query time, so the RUB series are all there is to load.
+            # The whole plan comes from a single gap scan over all currencies.
+            pending = await self._carry_over_gaps(
+                await self.repository.get_missing_intervals(
+                    all_currencies, start_date, end_date
+                ),
+                start_date,
+                end_date,
             )
-            if existing_rate:
-                consecutive_failures = 0
-                continue
 
-            logger.info(
-                f"Loading historical rate for {currency}/{base_currency} on {target_date}"
+            # RUB-based data is available either as one daily document per
+            # publication or as one series request per currency interval.
+            # Pick whichever needs fewer upstream requests.
+            documents = self.publications.group_by_document(
+                {
+                    d
+                    for intervals in pending.values()
+                    for d in expand_date_intervals(intervals)
+                }
             )
-            try:
-                if base_currency == "RUB":
-                    rate = await self.get_currency_exchange_rate(currency, target_date)
-                    historical_rate = HistoricalRate(
-                        date=target_date.isoformat(), rate=rate
-                    )
-                else:
-                    currency_to_rub = await self.get_currency_exchange_rate(
-                        currency, target_date
-                    )
-                    base_to_rub = await self.get_currency_exchange_rate(
-                        base_currency, target_date
-                    )
-                    cross_rate = currency_to_rub / base_to_rub
-                    historical_rate = HistoricalRate(
-                        date=target_date.isoformat(), rate=cross_rate
-                    )
+            range_requests = sum(len(intervals) for intervals in pending.values())
 
-                rates_to_save.append(historical_rate)
-                consecutive_failures = 0
+            scheduler = self._preload_scheduler()
+            if len(documents) <= range_requests:
+                logger.info(
+                    f"Preloading {len(documents)} daily documents for {len(pending)} currencies"
+                )
+                for document_date, covered in documents.items():
+                    scheduler.submit(
+                        ("snapshot", document_date),
+                        partial(self.ingest_snapshot, document_date, covered),
+                    )
+                summary = await scheduler.run(
+                    _preload_progress(job, "dates", end_date, done)
+                )
+                done += summary.completed + len(summary.failed)
                 logger.info(
-                    f"Successfully loaded rate for {currency}/{base_currency} on {target_date}: {historical_rate.rate}"
+                    f"Preloaded {summary.completed} snapshots, {len(summary.failed)} failed"
                 )
 
-            except Exception as e:
-                consecutive_failures += 1
-                failed_dates.append(target_date)
-                logger.error(
-                    f"Failed to load rate for {target_date} in pair {currency}/{base_currency}: {e}"
+                # Whatever the snapshots did not cover is fetched as ranges.
+                pending = await self.repository.get_missing_intervals(
+                    pending, start_date, end_date
+                )
+            else:
+                logger.info(
+                    f"Preloading {range_requests} currency series for {len(pending)} currencies"
                 )
-                if consecutive_failures >= 3:
-                    await asyncio.sleep(5 * 60)
-                    consecutive_failures = 0
-                continue
 
-        if rates_to_save:
-            try:
-                self.repository.save_rates(currency, base_currency, rates_to_save)
-            except Exception as e:
-                logger.error(
-                    f"Failed to save rates for {currency}/{base_currency}: {e}"
+            for currency, intervals in pending.items():
+                for interval_start, interval_end in intervals:
+                    scheduler.submit(
+                        ("series", currency, interval_start, interval_end),
+                        partial(
+                            self._fetch_rub_series,
+                            currency,
+                            interval_start,
+                            interval_end,
+                        ),
+                    )
+            summary = await scheduler.run(
+                _preload_progress(job, "pairs", end_date, done)
+            )
+            if summary.completed or summary.failed:
+                logger.info(
+                    f"Preloaded {summary.completed} currency series, {len(summary.failed)} failed"
                 )
 
-        if failed_dates:
-            pass
+        except Exception as e:
+            raise e
 
-    async def get_currency_exchange_rate(
-        self, char_code: str, date: Optional[date] = None
-    ) -> float:
+    async def preload_job(self, job: JobContext) -> None:
         """
-        Get exchange rate for a specific currency to RUB.
+        The `preload` background job. A resumed run keeps the end date of the
+        first one, so its checkpoint still describes the same range.
         """
-        cache_key = f"rate:{char_code.upper()}:{date.isoformat() if date else 'latest'}"
+        end = job.checkpoint.get("end")
+        await self.preload_historical_data(
+            days=int(job.params["days"]),
+            end_date=date.fromisoformat(end) if end else None,
+            job=job,
+        )
 
-        if self.redis_client:
-            try:
-                cached_data = self.redis_client.get(cache_key)
-                if cached_data and isinstance(cached_data, str):
-                    return float(cached_data)
-            except redis.RedisError:
-                pass
+    async def _carry_over_gaps(
+        self, gaps: Dict[str, List[Tuple[date, date]]], start_date: date, end_date: date
+    ) -> Dict[str, List[Tuple[date, date]]]:
+        """
+        Fill missing days without a publication of their own from the stored
+        rates of the document in effect on them, with no upstream request.
+        Returns what is still missing.
+        """
+        sources = {
+            day: self.publications.document_date(day)
+            for intervals in gaps.values()
+            for day in expand_date_intervals(intervals)
+        }
+        sources = {day: source for day, source in sources.items() if source != day}
+        if not sources or not await self.repository.copy_rates(gaps, sources):
+            return gaps
+        return await self.repository.get_missing_intervals(gaps, start_date, end_date)
 
-        if date is not None:
-            db_rate = self.repository.get_rate_by_date(char_code, "RUB", date)
-            if db_rate:
-                if self.redis_client:
-                    try:
-                        self.redis_client.setex(cache_key, 3600, str(db_rate.rate))
-                    except redis.RedisError:
-                        pass
-                return db_rate.rate
-
-        async with httpx.AsyncClient() as client:
-            response = await self._make_request(client, date)
-            currency_rate = self._parse_currency_rate(response.content, char_code)
-
-            if date is not None:
-                historical_rate = HistoricalRate(
-                    date=date.isoformat(), rate=currency_rate
+    async def compact_archive(self, job: Optional[JobContext] = None) -> int:
+        """
+        Copy past years from the database into the archive, with the
+        currencies whose rates are complete for the whole year. A year is
+        written again once more of its currencies are complete.
+        Returns the number of years written.
+        """
+        if self.archive is None:
+            return 0
+        first_date = await self.repository.get_first_rate_date()
+        if first_date is None:
+            return 0
+        years = range(first_date.year, date.today().year)
+        written = 0
+        for done, year in enumerate(years, start=1):
+            start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+            complete = await self.repository.get_complete_currencies(
+                start_date, end_date
+            )
+            segment = self.archive.segment(year)
+            if complete and not (segment and set(complete) <= set(segment.currencies)):
+                rows = await self.repository.get_rate_matrix_rows(
+                    complete, start_date, end_date
+                )
+                matrix = RateMatrix.from_rows(start_date, end_date, complete, rows)
+                await asyncio.to_thread(
+                    self.archive.write, year, matrix.currencies, matrix.values
                 )
-                self.repository.save_single_rate(char_code, "RUB", historical_rate)
+                written += 1
+                logger.info(f"Archived {len(complete)} currencies for {year}")
+            if job:
+                job.report(done, len(years), "years")
+        return written
 
-            if self.redis_client:
-                try:
-                    self.redis_client.setex(
-                        cache_key, 3600, str(currency_rate)  # ttl 1 hour
-                    )
-                except redis.RedisError:
-                    pass
+    async def archive_job(self, job: JobContext) -> None:
+        """
+        The `archive` background job.
+        """
+        await self.compact_archive(job)
 
-            return currency_rate
+    def _preload_scheduler(self) -> PreloadScheduler:
+        return PreloadScheduler(
+            self.rate_limiter,
+            concurrency=self.config.preload_concurrency,
+            max_retries=self.config.preload_max_retries,
+            backoff_base=self.config.preload_backoff_base,
+            backoff_max=self.config.preload_backoff_max,
+        )
+
+    async def _fetch_rub_series(
+        self, currency: str, start_date: date, end_date: date
+    ) -> int:
+        """
+        Fetch the RUB rate of a currency for every day of an interval in one request.
+        Past days the CBR has no rate for are recorded, so they are not fetched again.
+        """
+        cbr_id = await self._get_currency_id(currency)
+        # Look back far enough to carry the last publication before the
+        # interval over weekends and the New Year holidays.
+        xml_content = await self.cbr_client.fetch_dynamic(
+            cbr_id, start_date - timedelta(days=SERIES_LOOKBACK_DAYS), end_date
+        )
+        series = fill_calendar_days(
+            parse_dynamic(xml_content),
+            start_date,
+            end_date,
+            in_effect_until=self._series_in_effect_until,
+        )
+        written = await self.repository.save_rate_rows(
+            (currency, day.isoformat(), rate) for day, rate in sorted(series.items())
+        )
+        unavailable = [
+            day
+            for day in expand_date_intervals(
+                [(start_date, min(end_date, date.today()))]
+            )
+            if day not in series
+        ]
+        if unavailable:
+            await self.repository.save_unavailable_days(currency, unavailable)
+        return written
+
+    def _series_in_effect_until(self, document_date: date) -> date:
+        """
+        The last day a series record can be carried to: the day the next
+        document is expected to be published, or a few days later.
+        """
+        return max(
+            self.publications.next_after(document_date).date(),
+            document_date + timedelta(days=SERIES_CARRY_DAYS),
+        )
+
+    async def _get_currency_id(self, currency: str) -> str:
+        """
+        Get the CBR internal id used by the series endpoint for a currency code.
+        Delisted currencies keep the id stored while they were listed.
+        """
+        code = currency.upper()
+        ids = (await self.get_currency_catalogue()).ids
+        if code in ids:
+            return ids[code]
+        cbr_id = (await self.repository.get_currency_ids()).get(code)
+        if cbr_id:
+            return cbr_id
+        if code not in self._unlisted:
+            # Possibly listed since the catalogue was last refreshed; checked
+            # once per publication rather than on every retry.
+            await self._refresh_catalogue(
+                parse_daily(await self.cbr_client.fetch_daily())
+            )
+            ids = (await self.get_currency_catalogue()).ids
+            if code in ids:
+                return ids[code]
+            self._unlisted.add(code)
+        raise ValueError(f"Currency {currency} not found")
 
     async def get_all_currency_exchange_rates(
         self, base_currency: str, date: Optional[date] = None
     ) -> ExchangeRates:
-        cache_key = (
-            f"rates_all:{base_currency}:{date.isoformat() if date else 'latest'}"
+        return await self.cache.get_or_load(
+            _rates_key(base_currency, date),
+            self.cache.get_exchange_rates,
+            self.cache.set_exchange_rates,
+            partial(self._load_all_currency_exchange_rates, base_currency, date),
         )
 
-        if self.redis_client:
+    async def _load_all_currency_exchange_rates(
+        self, base_currency: str, date: Optional[date]
+    ) -> ExchangeRates:
+        if date is not None:
+            snapshot = await self.get_rate_snapshot(date)
+            exchange_rates = self._build_exchange_rates(
+                snapshot.rates, base_currency, snapshot.document_date
+            )
+        else:
             try:
-                cached_data = self.redis_client.get(cache_key)
-                if cached_data and isinstance(cached_data, str):
-                    data = json.loads(cached_data)
-                    return ExchangeRates(**data)
-            except (redis.RedisError, json.JSONDecodeError):
-                pass
-
-        params = self._build_request_params(date)
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self._base_url, params=params)
-            exchange_rates = self._parse_exchange_rates(response.content, base_currency)
-
-            if self.redis_client:
-                try:
-                    serialized_data = json.dumps(
-                        {
-                            "base": exchange_rates.base,
-                            "rates": exchange_rates.rates,
-                            "last_updated": exchange_rates.last_updated,
-                        }
-                    )
+                xml_content = await self.cbr_client.fetch_daily(date)
+            except Exception as e:
+                stale = await self._stale_exchange_rates(base_currency, e)
+                if stale is None:
+                    raise
+                return stale
+            exchange_rates = self._parse_exchange_rates(xml_content, base_currency)
+        return exchange_rates
 
-                    self.redis_client.setex(
-                        cache_key, 3600, serialized_data  # ttl 1 hour
-                    )
-                except redis.RedisError:
-                    pass
-
-            return exchange_rates
-
-    def _build_request_params(self, date: Optional[date]) -> Dict[str, str]:
-        return {"date_req": date.strftime("%d.%m.%Y")} if date else {}
-
-    async def _make_request(
-        self, client: httpx.AsyncClient, date: Optional[date]
-    ) -> httpx.Response:
-        """Make HTTP request to get exchange rates."""
-        params = self._build_request_params(date)
-        response = await client.get(self._base_url, params=params)
-        response.raise_for_status()
-        return response
-
-    def _parse_currency_rate(self, xml_content: bytes, char_code: str) -> float:
-        """Parse XML content to extract specific currency rate."""
-        root = ET.fromstring(xml_content)
-        target_code = char_code.upper()
-
-        for valute in root.findall("Valute"):
-            code_element = valute.find("CharCode")
-            if code_element is not None and code_element.text == target_code:
-                value_element = valute.find("Value")
-                nominal_element = valute.find("Nominal")
-                if value_element is not None and nominal_element is not None:
-                    value_text = value_element.text
-                    nominal_text = nominal_element.text
-                    if value_text is not None and nominal_text is not None:
-                        try:
-                            value_float = float(value_text.replace(",", "."))
-                            nominal_int = int(nominal_text)
-                            return value_float / nominal_int
-                        except (ValueError, TypeError):
-                            continue
-        raise ValueError(f"Currency {char_code} not found")
+    async def _stale_exchange_rates(
+        self, base_currency: str, error: Exception
+    ) -> Optional[ExchangeRates]:
+        """
+        The rates of the latest stored snapshot, served while the CBR is failing.
+        """
+        if not isinstance(error, CircuitOpenError) and not is_upstream_failure(error):
+            return None
+        latest = await self.repository.get_latest_snapshot_date(
+            date.today() + timedelta(days=1)
+        )
+        snapshot = await self.repository.get_snapshot(latest) if latest else None
+        if snapshot is None:
+            return None
+        logger.warning(
+            f"Serving the rates of {snapshot.document_date} while the CBR is failing: {error}"
+        )
+        return self._build_exchange_rates(
+            snapshot.rates, base_currency, snapshot.document_date
+        )
+
+    async def get_rate_snapshot(self, target_date: date) -> RateSnapshot:
+        """
+        Get the full RUB-based rate table for a date.
+        The CBR daily document is downloaded at most once per date and persisted in bulk.
+        Future dates are answered but never persisted, since the CBR serves
+        its newest document for them.
+        """
+        snapshot = await self.repository.get_snapshot(target_date)
+        if snapshot is not None:
+            return snapshot
+        # Weekends and holidays reuse the stored document in effect on them.
+        document_date = self.publications.document_date(target_date)
+        if document_date != target_date:
+            source = await self.repository.get_snapshot(document_date)
+            if (
+                source is not None
+                and parse_document_date(source.document_date) == document_date
+            ):
+                snapshot = RateSnapshot(
+                    date=target_date.isoformat(),
+                    document_date=source.document_date,
+                    rates=source.rates,
+                )
+                if target_date <= date.today():
+                    await self.repository.save_snapshot(snapshot)
+                return snapshot
+        return await self.ingest_snapshot(target_date)
+
+    async def ingest_snapshot(
+        self, target_date: date, days: Optional[List[date]] = None
+    ) -> RateSnapshot:
+        """
+        Fetch the CBR daily document for a date and upsert all of its rates in one transaction,
+        also for the `days` the publication calendar expects it to be in effect on.
+        The document is only stored if it is the one the calendar expects for
+        a date that is not in the future.
+        """
+        document = parse_daily(await self.cbr_client.fetch_daily(target_date))
+        snapshot = RateSnapshot(
+            date=target_date.isoformat(),
+            document_date=document.date,
+            rates=self._extract_rates_to_rub(document),
+        )
+        if target_date > date.today():
+            return snapshot
+        expected = self.publications.document_date(target_date)
+        if parse_document_date(document.date) != expected:
+            # The calendar is off for this date (an unlisted holiday or
+            # working day); leave the days to the series fetch.
+            logger.warning(
+                f"Expected the CBR document of {expected}, got {document.date}"
+            )
+            return snapshot
+        await self.repository.save_snapshot(
+            snapshot, sorted({target_date, *days}) if days else None
+        )
+        return snapshot
 
     def _parse_exchange_rates(
         self, xml_content: bytes, base_currency: str
     ) -> ExchangeRates:
-        root = ET.fromstring(xml_content)
-        rates_to_rub = self._extract_rates_to_rub(root)
-
-        if base_currency == "RUB":
-            exchange_rates = self._calculate_rub_base_rates(rates_to_rub)
-        else:
-            exchange_rates = self._calculate_cross_rates(rates_to_rub, base_currency)
+        document = parse_daily(xml_content)
+        return self._build_exchange_rates(
+            self._extract_rates_to_rub(document),
+            base_currency,
+            document.date,
+        )
 
+    def _build_exchange_rates(
+        self, rates_to_rub: Dict[str, float], base_currency: str, last_updated: str
+    ) -> ExchangeRates:
         return ExchangeRates(
             base=base_currency,
-            rates=exchange_rates,
-            last_updated=root.attrib.get("Date", ""),
+            rates=cross_rates(rates_to_rub, base_currency),
+            last_updated=last_updated,
         )
 
-    def _extract_rates_to_rub(self, root: ET.Element) -> Dict[str, float]:
-        rates = {}
-        for valute in root.findall("Valute"):
-            char_code = valute.findtext("CharCode")
-            value = valute.findtext("Value")
-            nominal = valute.findtext("Nominal")
+    def _extract_rates_to_rub(self, document: DailyDocument) -> Dict[str, float]:
+        rates = dict(document.rates)
+        rates["RUB"] = 1.0
+        return rates
 
-            if char_code is None or value is None or nominal is None:
-                continue
 
-            try:
-                rate = float(value.replace(",", ".")) / float(nominal)
-                rates[char_code] = rate
-            except (ValueError, TypeError):
-                continue
+def _check_range(start_date: date, end_date: date) -> None:
+    if start_date > end_date:
+        raise ValueError("Start date must not be after end date")
+    if start_date < FIRST_RATE_DATE:
+        raise ValueError(f"Start date must not be before {FIRST_RATE_DATE}")
+    if end_date > date.today() + timedelta(days=MAX_FUTURE_DAYS):
+        raise ValueError(f"End date must be within {MAX_FUTURE_DAYS} days from today")
 
-        rates["RUB"] = 1.0
-        return rates
 
-    def _calculate_rub_base_rates(self, rates: Dict[str, float]) -> Dict[str, float]:
-        return {currency: 1 / rate for currency, rate in rates.items()}
+def _rates_key(base_currency: str, day: Optional[date]) -> str:
+    return f"rates_all:{base_currency}:{day.isoformat() if day else 'latest'}"
+
+
+def _preload_progress(
+    job: Optional[JobContext], stage: str, end_date: date, done: int
+) -> Optional[Progress]:
+    """
+    Reports a preload stage to its job, counting `done` requests before it.
+    """
+    if job is None:
+        return None
+
+    def report(finished: int, submitted: int) -> None:
+        checkpoint = {"end": end_date.isoformat(), "done": done + finished}
+        job.report(done + finished, done + submitted, stage, checkpoint)
+
+    return report
 
-    def _calculate_cross_rates(
-        self, rates_to_rub: Dict[str, float], base_currency: str
-    ) -> Dict[str, float]:
-        if base_currency not in rates_to_rub:
-            raise ValueError(f"Base currency {base_currency} not found")
 
-        base_rate = rates_to_rub[base_currency]
-        return {currency: base_rate / rate for currency, rate in rates_to_rub.items()}
+def _year_length(year: int) -> int:
+    return 366 if calendar.isleap(year) else 365
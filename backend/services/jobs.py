@@ -0,0 +1,213 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from config import Config
+from models.job import Job
+from repositories.jobs_repository import JobProgress, JobsRepository
+
+JobHandler = Callable[["JobContext"], Awaitable[None]]
+
+# How long finished jobs stay queryable
+JOB_RETENTION = 7 * 24 * 3600.0
+PRUNE_INTERVAL = 3600.0
+
+
+class JobContext:
+    """
+    What a running job sees: its parameters, the checkpoint left by an
+    interrupted run, and `report` to publish its progress. Reports only
+    update memory; the manager persists them with every lease renewal.
+    """
+
+    def __init__(self, job: Job) -> None:
+        self.job_id = job.id
+        self.params = job.params
+        self.checkpoint: Dict[str, Any] = dict(job.checkpoint or {})
+        self.stage = job.stage
+        self.done = job.done
+        self.total = job.total
+        self._started = time.monotonic()
+        self._started_done = job.done
+
+    def report(
+        self,
+        done: int,
+        total: int,
+        stage: Optional[str] = None,
+        checkpoint: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.done = done
+        self.total = total
+        if stage is not None:
+            self.stage = stage
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+
+    def progress(self) -> JobProgress:
+        return JobProgress(
+            self.stage, self.done, self.total, self.checkpoint, self._eta()
+        )
+
+    def _eta(self) -> Optional[float]:
+        # Extrapolated from the pace since this run started.
+        progressed = self.done - self._started_done
+        if progressed <= 0 or self.done >= self.total:
+            return None
+        elapsed = time.monotonic() - self._started
+        return time.time() + elapsed / progressed * (self.total - self.done)
+
+
+class JobManager:
+    """
+    Runs registered background jobs on the event loop of the app. Jobs live
+    in the database all workers share, so any worker can submit, inspect or
+    cancel one; a lease keeps each job in a single worker and at most one job
+    of a kind running. A job whose worker stops is resumed from its checkpoint.
+    """
+
+    def __init__(
+        self,
+        repository: JobsRepository,
+        poll_interval: float = 2.0,
+        lease_ttl: float = 30.0,
+    ) -> None:
+        self.repository = repository
+        self.poll_interval = poll_interval
+        self.lease_ttl = lease_ttl
+        self._owner = uuid4().hex
+        self._handlers: Dict[str, JobHandler] = {}
+        self._running: Dict[str, Tuple["asyncio.Task[None]", JobContext]] = {}
+        # Jobs being stopped on request rather than by shutdown
+        self._stopping: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._next_prune = 0.0
+
+    @classmethod
+    def from_config(cls, repository: JobsRepository, config: Config) -> "JobManager":
+        return cls(
+            repository,
+            poll_interval=config.jobs_poll_interval,
+            lease_ttl=config.jobs_lease_ttl,
+        )
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        """
+        Queue a job, or return the identical one already queued or running.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind {kind}")
+        job = await self.repository.create_job(uuid4().hex, kind, params)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.repository.get_job(job_id)
+
+    async def recent(self, limit: int = 20) -> List[Job]:
+        return await self.repository.list_jobs(limit)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job wherever it runs; a job in another worker stops on that
+        worker's next poll.
+        """
+        job = await self.repository.request_cancel(job_id)
+        if job_id in self._running:
+            self._stop(job_id)
+        return job
+
+    async def run(self) -> None:
+        """
+        Claim, supervise and persist jobs until cancelled. Jobs still running
+        then are handed back to be resumed by the next worker.
+        """
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    await self._tick()
+                except Exception as e:
+                    logger.error(f"Job supervisor failed: {e}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            tasks = [task for task, _ in self._running.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _tick(self) -> None:
+        for job_id, (_, context) in list(self._running.items()):
+            saved = await self.repository.save_progress(
+                job_id, self._owner, context.progress(), self.lease_ttl
+            )
+            if not saved:
+                logger.warning(f"Lost the lease of job {job_id}, stopping it")
+                self._stop(job_id)
+        for job_id in await self.repository.get_cancel_requests(self._owner):
+            self._stop(job_id)
+
+        while True:
+            job = await self.repository.claim_job(
+                self._owner, list(self._handlers), self.lease_ttl
+            )
+            if job is None:
+                break
+            if job.cancel_requested:
+                # Cancelled after its previous worker went away.
+                await self.repository.finish_job(
+                    job.id, self._owner, "cancelled", JobContext(job).progress()
+                )
+                continue
+            self._start(job)
+
+        now = time.time()
+        if now >= self._next_prune:
+            await self.repository.delete_finished_jobs(now - JOB_RETENTION)
+            self._next_prune = now + PRUNE_INTERVAL
+
+    def _start(self, job: Job) -> None:
+        context = JobContext(job)
+        task = asyncio.create_task(self._execute(job.kind, context))
+        self._running[job.id] = (task, context)
+        resumed = " from its checkpoint" if job.checkpoint else ""
+        logger.info(f"Started {job.kind} job {job.id}{resumed}")
+
+    def _stop(self, job_id: str) -> None:
+        if job_id in self._running and job_id not in self._stopping:
+            self._stopping.add(job_id)
+            self._running[job_id][0].cancel()
+
+    async def _execute(self, kind: str, context: JobContext) -> None:
+        job_id = context.job_id
+        state, error = "completed", None
+        try:
+            await self._handlers[kind](context)
+        except asyncio.CancelledError:
+            if job_id not in self._stopping:
+                await self.repository.release_job(
+                    job_id, self._owner, context.progress()
+                )
+                logger.info(f"Released {kind} job {job_id} at {context.done}")
+                raise
+            state = "cancelled"
+        except Exception as e:
+            state, error = "failed", str(e)
+            logger.error(f"{kind} job {job_id} failed: {e}")
+        finally:
+            self._running.pop(job_id, None)
+            self._stopping.discard(job_id)
+
+        await self.repository.finish_job(
+            job_id, self._owner, state, context.progress(), error
+        )
+        logger.info(f"{kind} job {job_id} {state} ({context.done}/{context.total})")
@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+
+class MemoryCache:
+    """
+    Size-bounded, in-process LRU of decoded cache values.
+    An entry is fresh for `ttl` seconds and may then be served stale for
+    another `stale_ttl` seconds while it is being revalidated.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 60.0,
+        stale_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        # key -> (value, fresh until, stale until)
+        self._entries: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """
+        Return (value, is_fresh) for a live entry, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, fresh_until, stale_until = entry
+        now = self._clock()
+        if now > stale_until:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value, now <= fresh_until
+
+    def get_fresh(self, key: str) -> Optional[Any]:
+        entry = self.get(key)
+        if entry is None or not entry[1]:
+            return None
+        return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = self._clock()
+        fresh_until = now + (self.ttl if ttl is None else min(ttl, self.ttl))
+        self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, patterns: Iterable[str]) -> int:
+        """
+        Drop every entry whose key matches one of the glob patterns.
+        """
+        patterns = list(patterns)
+        keys = [
+            key
+            for key in self._entries
+            if any(fnmatchcase(key, pattern) for pattern in patterns)
+        ]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,156 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Set, Tuple
+from loguru import logger
+from services.circuit_breaker import CircuitOpenError
+
+Job = Callable[[], Awaitable[Any]]
+# Called with (jobs finished, jobs submitted) of the current run
+Progress = Callable[[int, int], None]
+
+
+class TokenBucket:
+    """
+    Async token bucket limiting how often upstream requests are started.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[int] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated) * self.rate
+                    )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class PreloadSummary:
+    completed: int = 0
+    retried: int = 0
+    failed: List[Hashable] = field(default_factory=list)
+
+
+class PreloadScheduler:
+    """
+    Runs preload jobs on a bounded pool of workers.
+    Every job start takes a token from the shared rate limiter, jobs are
+    deduplicated by key, and a failed job is put back on the queue after an
+    exponential, jittered delay so it never occupies a worker while waiting.
+    While the upstream circuit is open, jobs wait for it without using retries.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: TokenBucket,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ) -> None:
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue: asyncio.Queue[Tuple[Hashable, Job, int]] = asyncio.Queue()
+        self._keys: Set[Hashable] = set()
+        self._outstanding = 0
+        self._submitted = 0
+        self._done = asyncio.Event()
+        self._summary = PreloadSummary()
+        self._progress: Optional[Progress] = None
+
+    def submit(self, key: Hashable, job: Job) -> bool:
+        """
+        Schedule a job unless one with the same key was already submitted.
+        """
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._outstanding += 1
+        self._submitted += 1
+        self._queue.put_nowait((key, job, 0))
+        return True
+
+    async def run(self, progress: Optional[Progress] = None) -> PreloadSummary:
+        """
+        Run all submitted jobs, including their retries, to completion,
+        calling `progress` whenever one succeeds or finally fails.
+        """
+        self._progress = progress
+        self._report()
+        if self._outstanding:
+            self._done.clear()
+            workers = [
+                asyncio.create_task(self._worker())
+                for _ in range(min(self.concurrency, self._outstanding))
+            ]
+            try:
+                await self._done.wait()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        summary, self._summary = self._summary, PreloadSummary()
+        self._submitted = 0
+        self._progress = None
+        return summary
+
+    def _report(self) -> None:
+        if self._progress is not None:
+            finished = self._summary.completed + len(self._summary.failed)
+            self._progress(finished, self._submitted)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            key, job, attempt = await self._queue.get()
+            await self.rate_limiter.acquire()
+            try:
+                await job()
+                self._summary.completed += 1
+            except CircuitOpenError as e:
+                # The upstream is known to be down: wait for the circuit to
+                # half-open without spending one of the job's attempts.
+                loop.call_later(
+                    e.retry_after, self._queue.put_nowait, (key, job, attempt)
+                )
+                continue
+            except Exception as e:
+                if attempt < self.max_retries:
+                    delay = random.uniform(
+                        0, min(self.backoff_max, self.backoff_base * 2**attempt)
+                    )
+                    logger.warning(
+                        f"Preload job {key} failed ({e}), retrying in {delay:.1f}s"
+                    )
+                    self._summary.retried += 1
+                    loop.call_later(
+                        delay, self._queue.put_nowait, (key, job, attempt + 1)
+                    )
+                    continue
+                logger.error(
+                    f"Preload job {key} failed after {attempt + 1} attempts: {e}"
+                )
+                self._summary.failed.append(key)
+
+            self._outstanding -= 1
+            self._report()
+            if self._outstanding == 0:
+                self._done.set()
@@ -0,0 +1,96 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+MOSCOW_TZ = timezone(timedelta(hours=3), "MSK")
+
+# Non-working public holidays of the Labour Code (article 112), as (month, day).
+# Days moved by the yearly government decree are passed to the schedule.
+PUBLIC_HOLIDAYS = frozenset(
+    [(1, day) for day in range(1, 9)]
+    + [(2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4)]
+)
+
+
+class PublicationSchedule:
+    """
+    When the CBR publishes its rates: on business days at `publication_time`
+    Moscow time, effective from the next calendar day. Rates published on the
+    last business day before weekends and public holidays stay in effect over
+    them. `holidays` and `working_days` are the days off and working weekend
+    days set by decree on top of the fixed calendar.
+    """
+
+    def __init__(
+        self,
+        publication_time: time = time(15, 30),
+        holidays: Iterable[date] = (),
+        working_days: Iterable[date] = (),
+    ) -> None:
+        self.publication_time = publication_time
+        self.holidays = frozenset(holidays)
+        self.working_days = frozenset(working_days)
+
+    def is_publication_day(self, day: date) -> bool:
+        if day in self.working_days:
+            return True
+        if day in self.holidays or (day.month, day.day) in PUBLIC_HOLIDAYS:
+            return False
+        return day.weekday() < 5
+
+    def document_date(self, day: date) -> date:
+        """
+        The date of the document in effect on `day`: the day after the last
+        publication before it.
+        """
+        return self.published_at(day).date() + timedelta(days=1)
+
+    def group_by_document(self, days: Iterable[date]) -> Dict[date, List[date]]:
+        """
+        Group days by the date of the document in effect on them, so a single
+        download serves every day of a weekend or holiday.
+        """
+        groups: Dict[date, List[date]] = {}
+        for day in sorted(days):
+            groups.setdefault(self.document_date(day), []).append(day)
+        return groups
+
+    def publication_moment(self, day: date) -> datetime:
+        return datetime.combine(day, self.publication_time, MOSCOW_TZ)
+
+    def published_at(self, document_date: date) -> datetime:
+        """
+        When the document in effect on `document_date` was published.
+        """
+        day = document_date - timedelta(days=1)
+        while not self.is_publication_day(day):
+            day -= timedelta(days=1)
+        return self.publication_moment(day)
+
+    def next_after(self, document_date: date) -> datetime:
+        """
+        When the document following the one dated `document_date` is expected.
+        """
+        day = document_date
+        while not self.is_publication_day(day):
+            day += timedelta(days=1)
+        return self.publication_moment(day)
+
+    def next_publication(self, now: Optional[datetime] = None) -> datetime:
+        """
+        The first expected publication strictly after `now`.
+        """
+        now = now or datetime.now(MOSCOW_TZ)
+        day = now.astimezone(MOSCOW_TZ).date()
+        while not self.is_publication_day(day) or self.publication_moment(day) <= now:
+            day += timedelta(days=1)
+        return self.publication_moment(day)
+
+
+def parse_document_date(value: str) -> Optional[date]:
+    """
+    Parse the dd.mm.yyyy date of a CBR document.
+    """
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").date()
+    except ValueError:
+        return None
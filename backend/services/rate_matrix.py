@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+FloatArray = NDArray[np.float64]
+DayArray = NDArray[np.datetime64]
+
+
+def forward_fill(values: FloatArray) -> FloatArray:
+    """
+    Carry the last known value of every column down over NaN rows.
+    Rows before the first known value of a column stay NaN.
+    """
+    if values.size == 0:
+        return values.copy()
+    matrix = values.reshape(values.shape[0], -1)
+    rows = np.arange(matrix.shape[0])[:, None]
+    last_known = np.where(np.isnan(matrix), 0, rows)
+    np.maximum.accumulate(last_known, axis=0, out=last_known)
+    filled = matrix[last_known, np.arange(matrix.shape[1])]
+    return filled.reshape(values.shape)
+
+
+class RateMatrix:
+    """
+    Dates x currencies matrix of RUB-anchored rates (price of one unit in RUB).
+    Unknown values are NaN; the RUB column, if requested, is always 1.
+    """
+
+    def __init__(
+        self, start_date: date, currencies: Sequence[str], values: FloatArray
+    ) -> None:
+        self.start_date = start_date
+        self.currencies = list(currencies)
+        self.values = values
+        self._columns = {code: index for index, code in enumerate(self.currencies)}
+
+    @classmethod
+    def from_rows(
+        cls,
+        start_date: date,
+        end_date: date,
+        currencies: Iterable[str],
+        rows: Iterable[Tuple[str, int, float]],
+    ) -> "RateMatrix":
+        """
+        Build a matrix from (code, day offset from start_date, rate) rows.
+        """
+        codes = list(dict.fromkeys(code.upper() for code in currencies))
+        columns = {code: index for index, code in enumerate(codes)}
+        values = np.full(((end_date - start_date).days + 1, len(codes)), np.nan)
+        if "RUB" in columns:
+            values[:, columns["RUB"]] = 1.0
+
+        selected = [(offset, columns[code], rate) for code, offset, rate in rows]
+        if selected:
+            offsets, indices, rates = zip(*selected)
+            values[np.array(offsets), np.array(indices)] = rates
+        return cls(start_date, codes, values)
+
+    @property
+    def end_date(self) -> date:
+        return self.start_date + timedelta(days=len(self.values) - 1)
+
+    def is_complete(self, until: Optional[date] = None) -> bool:
+        """
+        Whether every value is known, optionally only up to a date.
+        """
+        values = self.values
+        if until is not None:
+            values = values[: max(0, (until - self.start_date).days + 1)]
+        return not bool(np.isnan(values).any())
+
+    def column(self, currency: str) -> FloatArray:
+        index = self._columns.get(currency.upper())
+        if index is None:
+            raise ValueError(f"Currency {currency} not found")
+        return self.values[:, index]
+
+    def pair_series(self, currency: str, base_currency: str) -> FloatArray:
+        """
+        Price of `currency` in `base_currency` for every date, in one division.
+        """
+        return self.column(currency) / self.column(base_currency)
+
+
+def cross_rates(
+    rates_to_rub: Mapping[str, float], base_currency: str
+) -> Dict[str, float]:
+    """
+    Units of every currency per one unit of `base_currency` from one rate table.
+    """
+    codes = list(rates_to_rub)
+    return _quote(
+        codes, np.fromiter(rates_to_rub.values(), np.float64, len(codes)), base_currency
+    )
+
+
+def _quote(
+    currencies: List[str], rates: FloatArray, base_currency: str
+) -> Dict[str, float]:
+    try:
+        base_index = currencies.index(base_currency.upper())
+    except ValueError:
+        raise ValueError(f"Base currency {base_currency} not found") from None
+    quoted = rates[base_index] / rates
+    known = ~np.isnan(quoted)
+    if known.all():
+        return dict(zip(currencies, quoted.tolist()))
+    return dict(
+        zip(
+            (code for code, ok in zip(currencies, known.tolist()) if ok),
+            quoted[known].tolist(),
+        )
+    )
+
+
+def resample_ohlc_arrays(
+    start_date: date, values: FloatArray, period: str
+) -> Tuple[DayArray, FloatArray, FloatArray, FloatArray, FloatArray]:
+    """
+    Open, high, low and close of a daily series per calendar week (Monday to
+    Sunday) or month: first days of the periods, then the open, high, low and
+    close arrays. Unknown days are skipped.
+    """
+    days = np.datetime64(start_date, "D") + np.arange(len(values))
+    known = ~np.isnan(values)
+    days, values = days[known], values[known]
+    if not len(values):
+        return days, values, values, values, values
+
+    if period == "weekly":
+        # Day 0 of the epoch is a Thursday, so shifting by 3 starts weeks on Monday.
+        keys = (days.astype(np.int64) + 3) // 7
+    elif period == "monthly":
+        keys = days.astype("datetime64[M]").astype(np.int64)
+    else:
+        raise ValueError(f"Unknown period {period}")
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(values)] - 1
+    return (
+        days[starts],
+        values[starts],
+        np.maximum.reduceat(values, starts),
+        np.minimum.reduceat(values, starts),
+        values[ends],
+    )
+
+
+def lttb(values: FloatArray, threshold: int) -> NDArray[np.intp]:
+    """
+    Indices of at most `threshold` points of a series picked by
+    Largest-Triangle-Three-Buckets, which keeps the visual shape of the line.
+    Unknown values are skipped; the first and last known points are always kept.
+    """
+    index = np.flatnonzero(~np.isnan(values))
+    count = len(index)
+    if threshold >= count or threshold < 3:
+        return index if threshold >= count else index[[0, -1]][:threshold]
+
+    x = index.astype(np.float64)
+    y = values[index]
+    # Interior points split into threshold - 2 buckets.
+    edges = (np.arange(threshold - 1) * ((count - 2) / (threshold - 2))).astype(
+        np.intp
+    ) + 1
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = previous = 0
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_low, next_high = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_low, next_high = count - 1, count
+        average_x = x[next_low:next_high].mean()
+        average_y = y[next_low:next_high].mean()
+        areas = np.abs(
+            (x[previous] - average_x) * (y[low:high] - y[previous])
+            - (x[previous] - x[low:high]) * (average_y - y[previous])
+        )
+        previous = low + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    selected[-1] = count - 1
+    return index[selected]
@@ -0,0 +1,32 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Set
+
+PUBLICATIONS_CHANNEL = "rates:published"
+
+
+class RateUpdates:
+    """
+    In-process fan-out of new CBR publications (their document dates) to
+    subscribers such as SSE streams. A slow subscriber only keeps the most
+    recent notice, since it reloads the latest rates anyway.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: Set["asyncio.Queue[str]"] = set()
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator["asyncio.Queue[str]"]:
+        queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def notify(self, document_date: str) -> None:
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(document_date)
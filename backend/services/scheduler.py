@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from loguru import logger
+
+from config import Config
+from services.exchanges import ExchangesService
+from services.publication import MOSCOW_TZ
+
+LEADER_KEY = "scheduler:leader"
+
+
+class RateScheduler:
+    """
+    Checks the CBR for a new publication around the time one is expected and
+    ingests it. Every worker runs a scheduler, but only the holder of a Redis
+    lease polls; another worker takes over if the leader stops renewing it.
+    """
+
+    def __init__(
+        self,
+        exchanges_service: ExchangesService,
+        poll_interval: float = 300.0,
+        poll_lead: float = 1800.0,
+        lease_ttl: float = 60.0,
+    ) -> None:
+        self.exchanges_service = exchanges_service
+        self.poll_interval = poll_interval
+        self.poll_lead = poll_lead
+        self.lease_ttl = lease_ttl
+        self._token = uuid4().hex
+        # None means "check as soon as we lead"
+        self._next_check: Optional[datetime] = None
+
+    @classmethod
+    def from_config(
+        cls, exchanges_service: ExchangesService, config: Config
+    ) -> "RateScheduler":
+        return cls(
+            exchanges_service,
+            poll_interval=config.scheduler_poll_interval,
+            poll_lead=config.scheduler_poll_lead,
+            lease_ttl=config.scheduler_lease_ttl,
+        )
+
+    async def run(self) -> None:
+        """
+        Lead or stand by until cancelled.
+        """
+        cache = self.exchanges_service.cache
+        try:
+            while True:
+                if await cache.hold_lease(LEADER_KEY, self._token, self.lease_ttl):
+                    await self._check_if_due()
+                else:
+                    self._next_check = None
+                await asyncio.sleep(self._sleep_time())
+        finally:
+            await cache.release_lease(LEADER_KEY, self._token)
+
+    async def _check_if_due(self) -> None:
+        now = datetime.now(MOSCOW_TZ)
+        if self._next_check is not None and now < self._next_check:
+            return
+        try:
+            await self.exchanges_service.update_daily_rates()
+        except Exception as e:
+            logger.error(f"Scheduled rate update failed: {e}")
+        self._next_check = self._plan_next_check(now)
+        logger.debug(f"Next CBR publication check at {self._next_check}")
+
+    def _plan_next_check(self, now: datetime) -> datetime:
+        """
+        Poll every `poll_interval` from `poll_lead` before the next document
+        is expected until it shows up; stay idle otherwise.
+        """
+        latest = self.exchanges_service.latest_document_date
+        retry = now + timedelta(seconds=self.poll_interval)
+        if latest is None:
+            return retry
+        expected = self.exchanges_service.publications.next_after(latest)
+        return max(retry, expected - timedelta(seconds=self.poll_lead))
+
+    def _sleep_time(self) -> float:
+        # Wake up often enough to renew the lease before it lapses.
+        sleep = self.lease_ttl / 3
+        if self._next_check is not None:
+            until_check = (self._next_check - datetime.now(MOSCOW_TZ)).total_seconds()
+            sleep = min(sleep, max(until_check, 0.0))
+        return sleep
@@ -0,0 +1,90 @@
+import argparse
+import json
+import math
+import timeit
+from dataclasses import asdict
+from datetime import date, timedelta
+from typing import Callable, List
+
+import msgspec
+import numpy as np
+
+from services import encoding
+from services.encoding import ARROW_STREAM, COLUMNAR_JSON, MSGPACK
+from services.cache import _pack_array, _unpack_array
+from services.encoding import RateColumns, encode, to_historical_series
+from services.rate_matrix import FloatArray
+
+
+def legacy_pack(values: FloatArray) -> str:
+    """
+    The former Redis form: a JSON list with null for unknown days.
+    """
+    return json.dumps([None if math.isnan(rate) else rate for rate in values.tolist()])
+
+
+def legacy_unpack(value: str) -> FloatArray:
+    return np.array(
+        [np.nan if rate is None else rate for rate in json.loads(value)],
+        dtype=np.float64,
+    )
+
+
+def legacy_response(columns: RateColumns) -> bytes:
+    """
+    The former response path: dataclasses per point, encoded as JSON.
+    """
+    return msgspec.json.encode(asdict(to_historical_series(columns)))
+
+
+def report(name: str, run: Callable[[], object], number: int) -> None:
+    best = min(timeit.repeat(run, number=number, repeat=5)) / number
+    print(f"{name:<34} {best * 1_000_000:9.1f} us")
+
+
+def main(years: int, number: int) -> None:
+    start = date.today() - timedelta(days=365 * years)
+    values = np.random.default_rng(0).uniform(60, 100, 365 * years)
+    values[np.arange(len(values)) % 7 == 6] = np.nan
+    columns = RateColumns(
+        meta={
+            "currency": "USD",
+            "base": "RUB",
+            "start": start.isoformat(),
+            "end": date.today().isoformat(),
+            "resolution": "daily",
+        },
+        dates=np.datetime64(start, "D") + np.arange(len(values)),
+        series={"rate": values},
+    )
+    legacy, packed = legacy_pack(values), _pack_array(values)
+    print(f"{len(values)} days: JSON {len(legacy)} bytes, packed {len(packed)} bytes")
+
+    report("cache write: JSON list", lambda: legacy_pack(values), number)
+    report("cache write: packed float64", lambda: _pack_array(values), number)
+    report("cache read: JSON list", lambda: legacy_unpack(legacy), number)
+    report("cache read: packed float64", lambda: _unpack_array(packed), number)
+
+    offered = encoding.media_types()
+    media_types: List[str] = [
+        media_type
+        for media_type in (COLUMNAR_JSON, MSGPACK, ARROW_STREAM)
+        if media_type in offered
+    ]
+    report("response: JSON records", lambda: legacy_response(columns), number)
+    for media_type in media_types:
+        report(
+            f"response: {media_type.rsplit('/', 1)[-1]}",
+            lambda: encode(columns, media_type),
+            number,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of cached array and response encodings."
+    )
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--number", type=int, default=50)
+    arguments = parser.parse_args()
+    main(arguments.years, arguments.number)
@@ -0,0 +1,90 @@
+import argparse
+import timeit
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+from xml.etree import ElementTree as ET
+
+from services import cbr_parser
+from services.cbr_parser import parse_daily, parse_dynamic
+from tools.fake_cbr.app import fake_cbr
+
+
+def legacy_daily(xml_content: bytes) -> Dict[str, float]:
+    """
+    The former path: a full tree, then findall/findtext per currency.
+    It only reads the rates, while parse_daily also reads ids, names and nominals.
+    """
+    root = ET.fromstring(xml_content)
+    rates = {}
+    for valute in root.findall("Valute"):
+        char_code = valute.findtext("CharCode")
+        value = valute.findtext("Value")
+        nominal = valute.findtext("Nominal")
+        if char_code is None or value is None or nominal is None:
+            continue
+        rates[char_code] = float(value.replace(",", ".")) / float(nominal)
+    rates["RUB"] = 1.0
+    return rates
+
+
+def legacy_dynamic(xml_content: bytes) -> List[Tuple[date, float]]:
+    root = ET.fromstring(xml_content)
+    series = []
+    for record in root.findall("Record"):
+        record_date = record.attrib.get("Date")
+        value = record.findtext("Value")
+        nominal = record.findtext("Nominal")
+        if record_date is None or value is None or nominal is None:
+            continue
+        series.append(
+            (
+                datetime.strptime(record_date, "%d.%m.%Y").date(),
+                float(value.replace(",", ".")) / float(nominal),
+            )
+        )
+    series.sort()
+    return series
+
+
+def cold_daily(xml_content: bytes) -> None:
+    cbr_parser._daily_cache.clear()
+    parse_daily(xml_content)
+
+
+def report(name: str, run: Callable[[], object], number: int) -> None:
+    best = min(timeit.repeat(run, number=number, repeat=5)) / number
+    print(f"{name:<34} {best * 1_000_000:9.1f} us")
+
+
+def main(number: int) -> None:
+    daily = fake_cbr.daily(date.today())
+    dynamic = fake_cbr.dynamic(
+        "R01235", date.today() - timedelta(days=365), date.today()
+    )
+    print(f"XML_daily {len(daily)} bytes, XML_dynamic (1 year) {len(dynamic)} bytes")
+
+    report("daily: ElementTree findall", lambda: legacy_daily(daily), number)
+    report("daily: parse_daily, cold", lambda: cold_daily(daily), number)
+    report("daily: parse_daily, memoized", lambda: parse_daily(daily), number)
+    # The former service parsed the same document once for the currency
+    # list, once for the rates and once per requested currency.
+    report(
+        "daily x3 callers: ElementTree",
+        lambda: [legacy_daily(daily) for _ in range(3)],
+        number,
+    )
+    report(
+        "daily x3 callers: memoized",
+        lambda: [parse_daily(daily) for _ in range(3)],
+        number,
+    )
+    report("dynamic: ElementTree findall", lambda: legacy_dynamic(dynamic), number)
+    report("dynamic: streaming", lambda: parse_dynamic(dynamic), number)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of the CBR XML parser against the ElementTree path."
+    )
+    parser.add_argument("--number", type=int, default=200)
+    main(parser.parse_args().number)
@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+from config import Config
+from services.cache import RatesCache
+from services.cbr_client import CbrClient
+from services.exchanges import ExchangesService
+from tools.fake_cbr import app
+from tools.fake_cbr.app import fake_cbr
+
+
+async def per_date_fetch(client: CbrClient, days: int) -> None:
+    start_date = date.today() - timedelta(days=days - 1)
+    for offset in range(days):
+        await client.fetch_daily(start_date + timedelta(days=offset))
+
+
+async def range_fetch(service: ExchangesService, days: int) -> None:
+    # What a backfill of USD/EUR runs: one series request per currency.
+    # Reads only schedule the backfill, so it is awaited here directly.
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    for currency in ("USD", "EUR"):
+        await service._fetch_rub_series(currency, start_date, end_date)
+
+
+async def main(days: int) -> None:
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+    client = CbrClient("http://fake-cbr/scripts", transport=transport)
+
+    config = Config(database_path=os.path.join(tempfile.mkdtemp(), "bench.db"))
+    service = ExchangesService(config=config, cache=RatesCache(None), cbr_client=client)
+
+    for name, run in (
+        ("per-date XML_daily", per_date_fetch(client, days)),
+        ("XML_dynamic ranges", range_fetch(service, days)),
+    ):
+        fake_cbr.requests.clear()
+        started = time.perf_counter()
+        await run
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:<20} {days} days: {sum(fake_cbr.requests.values()):>4} requests, "
+            f"{elapsed * 1000:8.1f} ms"
+        )
+
+    await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare per-date and range fetching against the fake CBR server."
+    )
+    parser.add_argument("--days", type=int, default=180)
+    asyncio.run(main(parser.parse_args().days))
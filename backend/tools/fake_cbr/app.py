@@ -0,0 +1,139 @@
+import math
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+from xml.etree import ElementTree as ET
+
+from litestar import Litestar, MediaType, Response, get
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+@dataclass
+class FakeValute:
+    cbr_id: str
+    num_code: str
+    char_code: str
+    nominal: int
+    name: str
+    value: float
+
+
+class FakeCbr:
+    """
+    Deterministic rate generator built from the daily document fixture.
+    Rates are published Tuesday to Saturday, as on the real feed, and drift
+    smoothly from the fixture values so every date has distinct data.
+    """
+
+    def __init__(self, fixture: Path = FIXTURES_DIR / "XML_daily.xml") -> None:
+        root = ET.fromstring(fixture.read_bytes())
+        self.valutes: List[FakeValute] = []
+        for valute in root.findall("Valute"):
+            self.valutes.append(
+                FakeValute(
+                    cbr_id=valute.attrib["ID"],
+                    num_code=valute.findtext("NumCode", ""),
+                    char_code=valute.findtext("CharCode", ""),
+                    nominal=int(valute.findtext("Nominal", "1")),
+                    name=valute.findtext("Name", ""),
+                    value=float(valute.findtext("Value", "0").replace(",", ".")),
+                )
+            )
+        self.requests: Counter[str] = Counter()
+
+    @staticmethod
+    def publication_date(target_date: date) -> date:
+        """The last date on or before `target_date` that has its own document."""
+        while target_date.isoweekday() in (7, 1):
+            target_date -= timedelta(days=1)
+        return target_date
+
+    def value(self, valute: FakeValute, publication_date: date) -> float:
+        index = self.valutes.index(valute)
+        drift = 0.03 * math.sin((publication_date.toordinal() + index * 11) / 17)
+        return round(valute.value * (1 + drift), 4)
+
+    def daily(self, target_date: date) -> bytes:
+        publication_date = self.publication_date(target_date)
+        root = ET.Element(
+            "ValCurs",
+            Date=publication_date.strftime("%d.%m.%Y"),
+            name="Foreign Currency Market",
+        )
+        for valute in self.valutes:
+            value = self.value(valute, publication_date)
+            node = ET.SubElement(root, "Valute", ID=valute.cbr_id)
+            ET.SubElement(node, "NumCode").text = valute.num_code
+            ET.SubElement(node, "CharCode").text = valute.char_code
+            ET.SubElement(node, "Nominal").text = str(valute.nominal)
+            ET.SubElement(node, "Name").text = valute.name
+            ET.SubElement(node, "Value").text = _format(value)
+            ET.SubElement(node, "VunitRate").text = _format(value / valute.nominal)
+        return bytes(ET.tostring(root, encoding="windows-1251"))
+
+    def dynamic(self, cbr_id: str, start_date: date, end_date: date) -> bytes:
+        root = ET.Element(
+            "ValCurs",
+            ID=cbr_id,
+            DateRange1=start_date.strftime("%d.%m.%Y"),
+            DateRange2=end_date.strftime("%d.%m.%Y"),
+            name="Foreign Currency Market Dynamic",
+        )
+        valute = next((v for v in self.valutes if v.cbr_id == cbr_id), None)
+        current_date = start_date
+        while valute is not None and current_date <= end_date:
+            if self.publication_date(current_date) == current_date:
+                value = self.value(valute, current_date)
+                node = ET.SubElement(
+                    root,
+                    "Record",
+                    Date=current_date.strftime("%d.%m.%Y"),
+                    Id=cbr_id,
+                )
+                ET.SubElement(node, "Nominal").text = str(valute.nominal)
+                ET.SubElement(node, "Value").text = _format(value)
+                ET.SubElement(node, "VunitRate").text = _format(value / valute.nominal)
+            current_date += timedelta(days=1)
+        return bytes(ET.tostring(root, encoding="windows-1251"))
+
+
+def _format(value: float) -> str:
+    return f"{value:.4f}".replace(".", ",")
+
+
+def _parse_date(value: Optional[str]) -> date:
+    if not value:
+        return date.today()
+    return datetime.strptime(value, "%d.%m.%Y").date()
+
+
+fake_cbr = FakeCbr()
+
+
+@get("/scripts/XML_daily.asp", media_type=MediaType.XML)
+async def xml_daily(date_req: Optional[str] = None) -> Response[bytes]:
+    fake_cbr.requests["XML_daily.asp"] += 1
+    return Response(content=fake_cbr.daily(_parse_date(date_req)))
+
+
+@get("/scripts/XML_dynamic.asp", media_type=MediaType.XML)
+async def xml_dynamic(
+    date_req1: str, date_req2: str, VAL_NM_RQ: str
+) -> Response[bytes]:
+    fake_cbr.requests["XML_dynamic.asp"] += 1
+    return Response(
+        content=fake_cbr.dynamic(
+            VAL_NM_RQ, _parse_date(date_req1), _parse_date(date_req2)
+        )
+    )
+
+
+@get("/stats")
+async def stats() -> Dict[str, int]:
+    return dict(fake_cbr.requests)
+
+
+app = Litestar(route_handlers=[xml_daily, xml_dynamic, stats])
@@ -1,6 +1,5 @@
 import "./App.css";
-import React, { useState, useEffect, useCallback } from "react";
-import axios from "axios";
+import React, { useState, useEffect } from "react";
 import CurrencyChart from "./CurrencyChart";
 
 function App() {
@@ -10,6 +9,7 @@ function App() {
   const [lastUpdated, setLastUpdated] = useState(null);
   const [baseCurrency, setBaseCurrency] = useState("USD");
   const [selectedCurrency, setSelectedCurrency] = useState(null);
+  const [connection, setConnection] = useState(0);
 
   const handleRateClick = (currency) => {
     setSelectedCurrency(currency);
@@ -19,24 +19,6 @@ function App() {
     setSelectedCurrency(null);
   };
 
-  const fetchRates = useCallback(async () => {
-    try {
-      setLoading(true);
-      setError(null);
-      const response = await axios.get(
-        `http://localhost:8000/api/currency/rates/${baseCurrency}`,
-        { timeout: 10000 }
-      );
-      setRates(response.data.rates);
-      setLastUpdated(new Date());
-    } catch (error) {
-      console.error("Error fetching rates:", error);
-      setError("Failed to fetch exchange rates. Please try again later.");
-    } finally {
-      setLoading(false);
-    }
-  }, [baseCurrency]);
-
   const formatRate = (rate) => {
     if (rate >= 1000) {
       return rate.toFixed(2);
@@ -48,10 +30,29 @@ function App() {
   };
 
   useEffect(() => {
-    fetchRates();
-    const interval = setInterval(fetchRates, 5 * 60 * 1000); // update data every 5 minutes
-    return () => clearInterval(interval);
-  }, [fetchRates]);
+    setLoading(true);
+    setError(null);
+    // The server sends the current rates right away and again after every
+    // new CBR publication, so there is nothing to poll.
+    const source = new EventSource(
+      `http://localhost:8000/api/currency/stream/${baseCurrency}`
+    );
+    source.addEventListener("rates", (event) => {
+      setRates(JSON.parse(event.data).rates);
+      setLastUpdated(new Date());
+      setError(null);
+      setLoading(false);
+    });
+    source.onerror = () => {
+      // EventSource reconnects by itself unless the stream was refused.
+      if (source.readyState === EventSource.CLOSED) {
+        console.error("Rates stream closed");
+        setError("Failed to fetch exchange rates. Please try again later.");
+        setLoading(false);
+      }
+    };
+    return () => source.close();
+  }, [baseCurrency, connection]);
 
   return (
     <div className="App">
@@ -78,7 +79,10 @@ function App() {
         {error && (
           <div className="error">
             <p>{error}</p>
-            <button onClick={fetchRates} style={{ marginTop: "10px" }}>
+            <button
+              onClick={() => setConnection((count) => count + 1)}
+              style={{ marginTop: "10px" }}
+            >
               Retry
             </button>
           </div>
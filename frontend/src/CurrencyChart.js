@@ -2,52 +2,110 @@ import React, { useState, useEffect } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import axios from 'axios';
 
+// Longer ranges are downsampled on the server (LTTB), so the chart never
+// receives more points than it can draw.
+const RANGES = [
+    { label: '1M', days: 30 },
+    { label: '6M', days: 180 },
+    { label: '1Y', days: 365 },
+    { label: '5Y', days: 5 * 365 },
+    { label: '10Y', days: 10 * 365 },
+];
+const MAX_POINTS = 500;
+// Retries of a partial range back off from the first delay and stop after the last one.
+const PARTIAL_RETRY_MS = 3000;
+const PARTIAL_RETRY_MAX_MS = 60000;
+const PARTIAL_RETRIES = 8;
+
+const toISODate = (date) => date.toISOString().slice(0, 10);
+
 function CurrencyChart({ currency, baseCurrency, onClose }) {
     const [historicalData, setHistoricalData] = useState([]);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState(null);
+    const [range, setRange] = useState(RANGES[1]);
 
     useEffect(() => {
-        console.log("CurrencyChart mounted with", currency, baseCurrency);
-        const fetchHistoricalData = async () => {
-            console.log("Fetching historical data for", currency, baseCurrency);
-            setLoading(true);
-            setError(null);
+        let cancelled = false;
+        let retryTimer = null;
+
+        const fetchHistoricalData = async (attempt) => {
+            const initial = attempt === 0;
+            if (initial) {
+                setLoading(true);
+                setError(null);
+            }
             try {
-                console.log("fetching data...");
+                const end = new Date();
+                const start = new Date(end);
+                start.setDate(end.getDate() - range.days + 1);
                 const response = await axios.get(
-                    `http://localhost:8000/api/currency/historical/${currency}/${baseCurrency}/180`,
-                    { timeout: 10000000 }
+                    `http://localhost:8000/api/currency/historical/${currency}/${baseCurrency}`,
+                    {
+                        params: {
+                            start: toISODate(start),
+                            end: toISODate(end),
+                            resolution: range.days > MAX_POINTS ? 'lttb' : 'daily',
+                            points: MAX_POINTS,
+                        },
+                        timeout: 60000,
+                    }
                 );
-                console.log("Data fetched:", response.data);
-                setHistoricalData(response.data);
+                if (cancelled) return;
+                setHistoricalData(response.data.rates);
+                // Missing days are loaded in the background; ask again until they are in.
+                if (response.headers['x-data-complete'] === 'false' && attempt < PARTIAL_RETRIES) {
+                    const delay = Math.min(PARTIAL_RETRY_MS * 2 ** attempt, PARTIAL_RETRY_MAX_MS);
+                    retryTimer = setTimeout(() => fetchHistoricalData(attempt + 1), delay);
+                }
             } catch (err) {
+                if (cancelled) return;
                 console.error("Error fetching historical data:", err);
                 setError('Failed to load historical data');
             } finally {
-                setLoading(false);
+                if (initial && !cancelled) setLoading(false);
             }
         };
-        fetchHistoricalData();
-    }, [currency, baseCurrency]);
+        fetchHistoricalData(0);
 
-    if (loading) return <div>Loading chart...</div>;
-    if (error) return <div>{error}</div>;
+        return () => {
+            cancelled = true;
+            clearTimeout(retryTimer);
+        };
+    }, [currency, baseCurrency, range]);
 
     return (
         <div style={{ position: 'fixed', top: 0, left: 0, width: '100%', height: '100%', background: 'rgba(0,0,0,0.5)', zIndex: 1000 }}>
             <div style={{ position: 'absolute', top: '50%', left: '50%', transform: 'translate(-50%, -50%)', background: 'white', padding: '20px', borderRadius: '10px', width: '80%', maxWidth: '800px' }}>
                 <button onClick={onClose} style={{ float: 'right' }}>Close</button>
                 <h2>Historical Rates for {currency} (Base: {baseCurrency})</h2>
-                <ResponsiveContainer width="100%" height={400}>
-                    <LineChart data={historicalData}>
-                        <CartesianGrid strokeDasharray="3 3" />
-                        <XAxis dataKey="date" />
-                        <YAxis />
-                        <Tooltip />
-                        <Line type="monotone" dataKey="rate" stroke="#8884d8" />
-                    </LineChart>
-                </ResponsiveContainer>
+                <div style={{ marginBottom: '10px' }}>
+                    {RANGES.map((option) => (
+                        <button
+                            key={option.label}
+                            onClick={() => setRange(option)}
+                            disabled={loading}
+                            style={{ marginRight: '5px', fontWeight: option === range ? 'bold' : 'normal' }}
+                        >
+                            {option.label}
+                        </button>
+                    ))}
+                </div>
+                {loading ? (
+                    <div>Loading chart...</div>
+                ) : error ? (
+                    <div>{error}</div>
+                ) : (
+                    <ResponsiveContainer width="100%" height={400}>
+                        <LineChart data={historicalData}>
+                            <CartesianGrid strokeDasharray="3 3" />
+                            <XAxis dataKey="date" />
+                            <YAxis domain={['auto', 'auto']} />
+                            <Tooltip />
+                            <Line type="monotone" dataKey="rate" stroke="#8884d8" dot={false} />
+                        </LineChart>
+                    </ResponsiveContainer>
+                )}
             </div>
         </div>
     );